@@ -5,11 +5,15 @@ This script navigates to a webpage, extracts the HTML, and then uses an LLM to e
 """
 
 import argparse
+import asyncio
+import atexit
+import functools
 import json
 import os
 import sys
+import traceback
 import tempfile
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 
 # Add the current directory to the Python path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
@@ -17,14 +21,140 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 # Import our modules
 try:
     from web_automation import WebAutomator
-    from structured_extraction import ExtractorClient, WebPage, Product, Article, SearchResult
+    from structured_extraction import (
+        ExtractorClient, WebPage, Product, Article, SearchResult
+    )
+    from llm_cache import get_default_cache, make_key
+    from html_cleaner import clean_html
+    import fast_json
 except ImportError:
     print(json.dumps({"error": "Could not import required modules. Make sure you've run setup.sh"}))
     sys.exit(1)
 
+# Maximum number of concurrent LLM requests, matching the server's parallel slots
+OLLAMA_NUM_PARALLEL = int(os.environ.get("OLLAMA_NUM_PARALLEL", 4))
+
+# Supported schemas by name
+_SCHEMA_MAP = {
+    "product": Product,
+    "article": Article,
+    "search_result": SearchResult
+}
+
+
+@functools.lru_cache(maxsize=None)
+def _get_automator(headless: bool = True) -> WebAutomator:
+    """Get a shared, already-started WebAutomator for the given headless mode.
+    
+    The browser is launched once per process and closed at interpreter exit,
+    so repeated calls to extract_from_url don't pay the browser launch cost.
+    
+    Args:
+        headless: Whether to run the browser in headless mode
+        
+    Returns:
+        WebAutomator: A started web automator
+    """
+    automator = WebAutomator(headless=headless, debug=True)
+    automator.__enter__()
+    atexit.register(automator.__exit__, None, None, None)
+    return automator
+
+
+def _extract_with_automator(automator: WebAutomator, url: str, schema_name: str,
+                            model_name: str = "qwen2:7b",
+                            instructions: Optional[str] = None) -> Dict[str, Any]:
+    """Navigate to a URL with an already-started automator and extract structured data.
+    
+    Args:
+        automator: A started WebAutomator instance
+        url: The URL to navigate to
+        schema_name: The schema to extract (product, article, search_result)
+        model_name: The name of the LLM model to use
+        instructions: Optional specific instructions for extraction
+        
+    Returns:
+        Dict: Result containing structured data or error
+    """
+    # Step 1: Navigate to the URL and get the HTML
+    navigation_result = automator.navigate(url)
+    
+    if not navigation_result.get("success", False):
+        return {
+            "success": False,
+            "error": navigation_result.get("error", "Navigation failed"),
+            "url": url
+        }
+        
+    # Step 2: Create a WebPage object from the navigation result
+    webpage = WebPage(
+        url=navigation_result["url"],
+        title=navigation_result["title"],
+        html=clean_html(navigation_result["html"], schema_name)
+    )
+    
+    # Step 3: Get the appropriate schema
+    schema = _SCHEMA_MAP.get(schema_name)
+    
+    if not schema:
+        return {
+            "success": False,
+            "error": f"Unknown schema: {schema_name}",
+            "url": url
+        }
+        
+    # Step 4: Reuse a cached extraction for the same page, or call the LLM
+    cache = get_default_cache()
+    cache_key = make_key(schema_name, model_name, webpage.html, instructions)
+    extraction_result = cache.get(cache_key)
+    
+    if extraction_result is None:
+        extractor = ExtractorClient(model_name=model_name)
+        extraction_result = extractor.extract_data(webpage, schema, instructions)
+        
+        if extraction_result.get("success", False):
+            cache.set(cache_key, extraction_result)
+    
+    # Step 5: Combine the results
+    return _combine_results(url, schema_name, navigation_result, extraction_result)
+
+
+def _combine_results(url: str, schema_name: str, navigation_result: Dict[str, Any],
+                     extraction_result: Dict[str, Any]) -> Dict[str, Any]:
+    """Combine a navigation result and an extraction result into one response.
+    
+    Args:
+        url: The requested URL
+        schema_name: The schema that was extracted
+        navigation_result: Result of WebAutomator.navigate
+        extraction_result: Result of ExtractorClient.extract_data
+        
+    Returns:
+        Dict: Combined result
+    """
+    combined_result = {
+        "success": extraction_result.get("success", False),
+        "url": url,
+        "title": navigation_result["title"],
+        "schema": schema_name,
+        "timestamp": navigation_result["timestamp"],
+    }
+    
+    if extraction_result.get("success", False):
+        combined_result["data"] = extraction_result["data"]
+    else:
+        combined_result["error"] = extraction_result.get("error", "Extraction failed")
+        
+    # Add screenshot if available
+    if "screenshot" in navigation_result:
+        combined_result["screenshot"] = navigation_result["screenshot"]
+        
+    return combined_result
+
 
 def extract_from_url(url: str, schema_name: str, headless: bool = True, 
-                    model_name: str = "qwen2:7b", instructions: Optional[str] = None) -> Dict[str, Any]:
+                    model_name: str = "qwen2:7b", instructions: Optional[str] = None,
+                    automator: Optional[WebAutomator] = None) -> Dict[str, Any]:
     """Navigate to a URL and extract structured data.
     
     Args:
@@ -33,70 +163,19 @@ def extract_from_url(url: str, schema_name: str, headless: bool = True,
         headless: Whether to run the browser in headless mode
         model_name: The name of the LLM model to use
         instructions: Optional specific instructions for extraction
+        automator: Optional started WebAutomator to reuse. If not provided, a
+            shared browser for the given headless mode is used.
         
     Returns:
         Dict: Result containing structured data or error
     """
     try:
-        # Step 1: Navigate to the URL and get the HTML
-        with WebAutomator(headless=headless, debug=True) as automator:
-            navigation_result = automator.navigate(url)
-            
-            if not navigation_result.get("success", False):
-                return {
-                    "success": False,
-                    "error": navigation_result.get("error", "Navigation failed"),
-                    "url": url
-                }
-                
-            # Step 2: Create a WebPage object from the navigation result
-            webpage = WebPage(
-                url=navigation_result["url"],
-                title=navigation_result["title"],
-                html=navigation_result["html"]
-            )
-            
-            # Step 3: Get the appropriate schema
-            schema_map = {
-                "product": Product,
-                "article": Article,
-                "search_result": SearchResult
-            }
-            schema = schema_map.get(schema_name)
-            
-            if not schema:
-                return {
-                    "success": False,
-                    "error": f"Unknown schema: {schema_name}",
-                    "url": url
-                }
-                
-            # Step 4: Create an extractor client and extract the data
-            extractor = ExtractorClient(model_name=model_name)
-            extraction_result = extractor.extract_data(webpage, schema, instructions)
+        if automator is None:
+            automator = _get_automator(headless)
             
-            # Step 5: Combine the results
-            combined_result = {
-                "success": extraction_result.get("success", False),
-                "url": url,
-                "title": navigation_result["title"],
-                "schema": schema_name,
-                "timestamp": navigation_result["timestamp"],
-            }
-            
-            if extraction_result.get("success", False):
-                combined_result["data"] = extraction_result["data"]
-            else:
-                combined_result["error"] = extraction_result.get("error", "Extraction failed")
-                
-            # Add screenshot if available
-            if "screenshot" in navigation_result:
-                combined_result["screenshot"] = navigation_result["screenshot"]
-                
-            return combined_result
+        return _extract_with_automator(automator, url, schema_name, model_name, instructions)
             
     except Exception as e:
-        import traceback
         return {
             "success": False,
             "error": str(e),
@@ -105,6 +184,119 @@ def extract_from_url(url: str, schema_name: str, headless: bool = True,
         }
 
 
+def extract_from_urls(urls: List[str], schema_name: str, headless: bool = True,
+                      model_name: str = "qwen2:7b",
+                      instructions: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Navigate to several URLs with a single browser and extract structured data.
+    
+    Args:
+        urls: The URLs to navigate to
+        schema_name: The schema to extract (product, article, search_result)
+        headless: Whether to run the browser in headless mode
+        model_name: The name of the LLM model to use
+        instructions: Optional specific instructions for extraction
+        
+    Returns:
+        List[Dict]: One result per URL, in the same order as urls
+    """
+    try:
+        with WebAutomator(headless=headless, debug=True) as automator:
+            return [
+                extract_from_url(url, schema_name, headless, model_name, instructions,
+                                 automator=automator)
+                for url in urls
+            ]
+            
+    except Exception as e:
+        return [{
+            "success": False,
+            "error": str(e),
+            "traceback": traceback.format_exc(),
+            "url": url
+        } for url in urls]
+
+
+async def extract_from_urls_async(urls: List[str], schema_name: str, headless: bool = True,
+                                  model_name: str = "qwen2:7b",
+                                  instructions: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Navigate to several URLs with a single browser and run the LLM extractions concurrently.
+    
+    Navigation is done one page at a time on one browser; the extractions are then
+    sent to the LLM server concurrently, up to OLLAMA_NUM_PARALLEL at a time.
+    
+    Args:
+        urls: The URLs to navigate to
+        schema_name: The schema to extract (product, article, search_result)
+        headless: Whether to run the browser in headless mode
+        model_name: The name of the LLM model to use
+        instructions: Optional specific instructions for extraction
+        
+    Returns:
+        List[Dict]: One result per URL, in the same order as urls
+    """
+    schema = _SCHEMA_MAP.get(schema_name)
+    
+    if not schema:
+        return [{
+            "success": False,
+            "error": f"Unknown schema: {schema_name}",
+            "url": url
+        } for url in urls]
+        
+    def navigate_all() -> List[Dict[str, Any]]:
+        with WebAutomator(headless=headless, debug=True) as automator:
+            return [automator.navigate(url) for url in urls]
+            
+    # Step 1: Navigate to every URL with one browser. The Playwright sync API
+    # can't run inside an event loop, so this happens on a worker thread.
+    loop = asyncio.get_running_loop()
+    try:
+        navigation_results = await loop.run_in_executor(None, navigate_all)
+    except Exception as e:
+        return [{
+            "success": False,
+            "error": str(e),
+            "traceback": traceback.format_exc(),
+            "url": url
+        } for url in urls]
+    
+    cache = get_default_cache()
+    extractor = ExtractorClient(model_name=model_name)
+    semaphore = asyncio.Semaphore(OLLAMA_NUM_PARALLEL)
+    
+    async def extract_one(url: str, navigation_result: Dict[str, Any]) -> Dict[str, Any]:
+        if not navigation_result.get("success", False):
+            return {
+                "success": False,
+                "error": navigation_result.get("error", "Navigation failed"),
+                "url": url
+            }
+            
+        webpage = WebPage(
+            url=navigation_result["url"],
+            title=navigation_result["title"],
+            html=clean_html(navigation_result["html"], schema_name)
+        )
+        
+        cache_key = make_key(schema_name, model_name, webpage.html, instructions)
+        extraction_result = cache.get(cache_key)
+        
+        if extraction_result is None:
+            async with semaphore:
+                extraction_result = await extractor.aextract_data(webpage, schema, instructions)
+                
+            if extraction_result.get("success", False):
+                cache.set(cache_key, extraction_result)
+                
+        return _combine_results(url, schema_name, navigation_result, extraction_result)
+        
+    # Step 2: Extract from every page concurrently
+    return list(await asyncio.gather(*[
+        extract_one(url, navigation_result)
+        for url, navigation_result in zip(urls, navigation_results)
+    ]))
+
+
 def parse_args():
     """Parse command line arguments."""
     parser = argparse.ArgumentParser(description="Extract structured data from a URL")
@@ -142,16 +334,13 @@ def main():
         instructions=args.instructions
     )
     
-    # Format the result as JSON
-    json_result = json.dumps(result, indent=2)
-    
-    # Output the result
+    # Output the result as JSON
     if args.output:
-        with open(args.output, "w") as f:
-            f.write(json_result)
+        with open(args.output, "wb") as f:
+            fast_json.dump(result, f, indent=True)
         print(f"Result saved to {args.output}")
     else:
-        print(json_result)
+        print(fast_json.dumps(result, indent=True))
 
 
 if __name__ == "__main__":
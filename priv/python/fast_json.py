@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+JSON helpers that use orjson when it is installed.
+This module falls back to the standard library json module otherwise.
+"""
+
+import codecs
+import json
+from typing import Any, BinaryIO, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps_bytes(obj: Any, indent: bool = False) -> bytes:
+    """Serialize an object to UTF-8 encoded JSON.
+
+    Args:
+        obj: Object to serialize
+        indent: Whether to indent the output by two spaces
+
+    Returns:
+        bytes: The JSON document
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+
+    return dumps(obj, indent).encode("utf-8")
+
+
+def dumps(obj: Any, indent: bool = False) -> str:
+    """Serialize an object to a JSON string.
+
+    Args:
+        obj: Object to serialize
+        indent: Whether to indent the output by two spaces
+
+    Returns:
+        str: The JSON document
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0).decode("utf-8")
+
+    if indent:
+        return json.dumps(obj, indent=2, ensure_ascii=False)
+    # Same compact output as orjson
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False)
+
+
+def dump(obj: Any, fp: BinaryIO, indent: bool = False) -> None:
+    """Serialize an object as UTF-8 encoded JSON into a binary file.
+
+    With the standard library the document is streamed into the file instead
+    of being built as one string first.
+
+    Args:
+        obj: Object to serialize
+        fp: File opened in binary mode
+        indent: Whether to indent the output by two spaces
+    """
+    if orjson is not None:
+        fp.write(orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0))
+        return
+
+    writer = codecs.getwriter("utf-8")(fp)
+    if indent:
+        json.dump(obj, writer, indent=2, ensure_ascii=False)
+    else:
+        json.dump(obj, writer, separators=(",", ":"), ensure_ascii=False)
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    """Deserialize a JSON document.
+
+    Args:
+        data: JSON document as a string or bytes
+
+    Returns:
+        Any: The deserialized object
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+
+    return json.loads(data)
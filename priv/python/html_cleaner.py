@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+HTML cleanup for LLM extraction.
+This module strips scripts, styles, and other non-content markup from HTML before it is sent to an LLM.
+"""
+
+import re
+from html import escape
+from html.parser import HTMLParser
+from typing import List, Optional, Tuple
+
+# Elements whose content is never useful for extraction
+DROP_TAGS = {"script", "style", "noscript", "svg", "iframe", "template", "canvas", "object", "title"}
+
+# Elements that are left out but whose content is kept (void elements among them never have content)
+SKIP_TAGS = {"html", "head", "meta", "link", "base", "embed"}
+
+# Elements that hold the main content of an article
+MAIN_TAGS = {"article", "main"}
+
+# Attributes worth keeping for extraction
+KEEP_ATTRS = {"href", "alt", "title"}
+
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+class _HTMLCleaner(HTMLParser):
+    """HTML parser that re-emits only content markup."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: List[str] = []
+        self.main_parts: List[str] = []
+        self.json_ld: List[str] = []
+        self._drop_depth = 0
+        self._main_depth = 0
+        self._in_json_ld = False
+
+    def _emit(self, text: str) -> None:
+        self.parts.append(text)
+        if self._main_depth > 0:
+            self.main_parts.append(text)
+
+    def handle_starttag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]) -> None:
+        if tag == "script" and dict(attrs).get("type") == "application/ld+json":
+            self._in_json_ld = True
+
+        if tag in DROP_TAGS:
+            self._drop_depth += 1
+            return
+
+        if self._drop_depth > 0 or tag in SKIP_TAGS:
+            return
+
+        kept = "".join(
+            f' {name}="{escape(value)}"'
+            for name, value in attrs
+            if name in KEEP_ATTRS and value and not value.startswith("data:")
+        )
+        if tag in MAIN_TAGS:
+            self._main_depth += 1
+
+        self._emit(f"<{tag}{kept}>")
+
+    def handle_startendtag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]) -> None:
+        if tag in DROP_TAGS or tag in SKIP_TAGS or self._drop_depth > 0:
+            return
+
+        kept = "".join(
+            f' {name}="{escape(value)}"'
+            for name, value in attrs
+            if name in KEEP_ATTRS and value and not value.startswith("data:")
+        )
+        self._emit(f"<{tag}{kept}>")
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag == "script":
+            self._in_json_ld = False
+
+        if tag in DROP_TAGS:
+            self._drop_depth = max(self._drop_depth - 1, 0)
+            return
+
+        if self._drop_depth > 0 or tag in VOID_TAGS or tag in SKIP_TAGS:
+            return
+
+        if tag in MAIN_TAGS and self._main_depth > 0:
+            self._emit(f"</{tag}>")
+            self._main_depth -= 1
+            return
+
+        self._emit(f"</{tag}>")
+
+    def handle_data(self, data: str) -> None:
+        if self._in_json_ld:
+            if data.strip():
+                self.json_ld.append(data.strip())
+            return
+
+        if self._drop_depth > 0:
+            return
+
+        text = _WHITESPACE_RE.sub(" ", data)
+        if text.strip():
+            self._emit(escape(text, quote=False))
+
+
+def clean_html(html: str, schema_name: Optional[str] = None) -> str:
+    """Reduce HTML to the markup that matters for structured extraction.
+
+    Scripts, styles, inline SVG, comments, and most attributes are removed. For
+    articles, only the <article>/<main> content is kept when the page has one.
+    For products, schema.org JSON-LD blocks are kept and placed first, since they
+    often describe the product completely.
+
+    Args:
+        html: Raw HTML content
+        schema_name: Optional name of the schema being extracted (product, article, search_result)
+
+    Returns:
+        str: Cleaned HTML
+    """
+    cleaner = _HTMLCleaner()
+    try:
+        cleaner.feed(html)
+        cleaner.close()
+    except Exception:
+        # Malformed markup shouldn't stop extraction; fall back to the raw HTML
+        return html
+
+    parts = cleaner.parts
+    if schema_name == "article" and cleaner.main_parts:
+        parts = cleaner.main_parts
+
+    cleaned = "".join(parts)
+
+    if schema_name == "product" and cleaner.json_ld:
+        json_ld = "".join(
+            f'<script type="application/ld+json">{block}</script>'
+            for block in cleaner.json_ld
+        )
+        cleaned = json_ld + cleaned
+
+    return cleaned
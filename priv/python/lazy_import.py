@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Deferred module imports.
+This module lets scripts name heavy dependencies at the top of the file without paying their import cost until first use.
+"""
+
+import importlib.util
+import sys
+from types import ModuleType
+from typing import Optional
+
+
+def lazyload(name: str) -> Optional[ModuleType]:
+    """Import a module lazily.
+
+    The module is located right away, but its code only runs when one of its
+    attributes is first accessed.
+
+    Args:
+        name: Fully qualified module name, e.g. "playwright.sync_api"
+
+    Returns:
+        Optional[ModuleType]: The module, or None if it is not installed
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+
+    try:
+        spec = importlib.util.find_spec(name)
+    except ModuleNotFoundError:
+        # A parent package is missing
+        return None
+
+    if spec is None or spec.loader is None:
+        return None
+
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
@@ -5,27 +5,127 @@ This script provides functionality to start, stop, and check the status of the L
 """
 
 import argparse
-import json
 import os
+import shutil
 import signal
 import socket
 import subprocess
 import sys
+import tempfile
 import time
 from pathlib import Path
 from typing import Dict, List, Optional, Union, Any, Tuple
 
+import fast_json
+
 # Default settings
 DEFAULT_MODEL = "qwen2.5-7b-instruct.Q4_K_M.gguf"
 DEFAULT_HOST = "127.0.0.1"
 DEFAULT_PORT = 8090
 DEFAULT_CONTEXT_SIZE = 4096
-DEFAULT_THREADS = 0  # 0 means auto-detect (use all available cores)
+DEFAULT_THREADS = 0  # 0 means auto-detect (use physical cores)
+DEFAULT_PARALLEL = 1  # Number of requests the server decodes concurrently; each slot adds n_ctx of KV cache
+# Model layers to offload to the GPU; -1 means auto-detect (all layers if nvidia-smi is found, else none)
+DEFAULT_GPU_LAYERS = int(os.environ.get("LLAMA_N_GPU_LAYERS", "-1"))
+PORT_CHECK_TIMEOUT = 0.1  # seconds
+STATUS_REQUEST_TIMEOUT = 0.5  # seconds
+STATUS_CACHE_TTL = 2.0  # seconds
+LOG_TAIL_BYTES = 16384  # how much of the server log to include in startup errors
+POLL_INTERVAL = 0.1  # seconds
+START_TIMEOUT = 5.0  # seconds to wait for the server to open its port
+READY_TIMEOUT = 30.0  # seconds to wait for the server to answer requests
+READY_REQUEST_TIMEOUT = 0.25  # seconds
 
 # Paths - these will need to be configured for your specific setup
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 LLAMA_DIR = os.environ.get("LLAMA_CPP_DIR", os.path.expanduser("~/llama.cpp"))
 MODELS_DIR = os.environ.get("LLAMA_MODELS_DIR", os.path.join(os.path.expanduser("~"), "llama_models"))
+MODEL_INDEX_FILE = ".model_index.json"
+MODEL_EXTENSIONS = (".gguf", ".bin")
+
+# Shared HTTP session, created on first use
+_SESSION = None
+
+# Recent check_server_status results, keyed by (host, port)
+_STATUS_CACHE: Dict[Tuple[str, int], Tuple[float, Dict[str, Any]]] = {}
+
+
+def _get_session():
+    """Get the shared keep-alive HTTP session, creating it on first use.
+    
+    Returns:
+        requests.Session: The shared session
+    """
+    global _SESSION
+    
+    if _SESSION is None:
+        import requests
+        from requests.adapters import HTTPAdapter
+        
+        # No retries: the session is only used for status and readiness probes,
+        # whose short timeouts would otherwise be multiplied by each retry. The
+        # readiness check already polls.
+        _SESSION = requests.Session()
+        _SESSION.mount("http://", HTTPAdapter(
+            pool_connections=16,
+            pool_maxsize=64,
+            max_retries=0
+        ))
+        
+    return _SESSION
+
+
+def _pid_file(port: int) -> str:
+    """Get the path of the PID file for a server started on a port.
+    
+    Args:
+        port: Port number of the server
+        
+    Returns:
+        str: Path to the PID file
+    """
+    return os.path.join(tempfile.gettempdir(), f"llama_server_{port}.pid")
+
+
+def _log_file(port: int) -> str:
+    """Get the path of the log file for a server started on a port.
+    
+    Args:
+        port: Port number of the server
+        
+    Returns:
+        str: Path to the log file
+    """
+    return os.path.join(tempfile.gettempdir(), f"llama_server_{port}.log")
+
+
+def _read_log(port: int, offset: int = 0) -> str:
+    """Read the end of a server's log, starting no earlier than an offset.
+    
+    Args:
+        port: Port number of the server
+        offset: Byte offset where the output of interest starts
+        
+    Returns:
+        str: The log output, or an empty string
+    """
+    try:
+        with open(_log_file(port), "rb") as f:
+            f.seek(0, os.SEEK_END)
+            f.seek(max(offset, f.tell() - LOG_TAIL_BYTES))
+            return f.read().decode("utf-8", errors="replace")
+    except OSError:
+        return ""
+
+
+def _invalidate_status(host: str, port: int) -> None:
+    """Drop any cached status for a server.
+    
+    Args:
+        host: Host address of the server
+        port: Port number of the server
+    """
+    _STATUS_CACHE.pop((host, port), None)
 
 
 def is_port_in_use(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> bool:
@@ -39,6 +139,7 @@ def is_port_in_use(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> bool:
         bool: Whether the port is in use
     """
     with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.settimeout(PORT_CHECK_TIMEOUT)
         return s.connect_ex((host, port)) == 0
 
 
@@ -63,6 +164,93 @@ def find_llama_server_executable() -> Optional[str]:
     return None
 
 
+def _dir_mtimes(dirs: List[str]) -> Optional[Dict[str, float]]:
+    """Get the modification times of a list of directories.
+    
+    Args:
+        dirs: Directories to check
+        
+    Returns:
+        Optional[Dict[str, float]]: Mapping of directory to mtime, or None if any is missing
+    """
+    try:
+        return {d: os.stat(d).st_mtime for d in dirs}
+    except OSError:
+        return None
+
+
+def _build_model_index() -> Dict[str, Any]:
+    """Scan MODELS_DIR once and write an index of the model files found.
+    
+    The index maps each model file's name and stem to its path, and records the
+    mtime of every scanned directory so it can tell when it is out of date.
+    
+    Returns:
+        Dict[str, Any]: The model index
+    """
+    index_path = os.path.join(MODELS_DIR, MODEL_INDEX_FILE)
+    
+    # Create the index file before scanning, since creating it changes the
+    # directory mtime we are about to record
+    try:
+        if not os.path.exists(index_path):
+            open(index_path, "a").close()
+    except OSError:
+        pass
+    
+    models: Dict[str, str] = {}
+    dirs: List[str] = []
+    pending = [MODELS_DIR]
+    
+    while pending:
+        directory = pending.pop()
+        dirs.append(directory)
+        try:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    # Like os.walk, don't descend into symlinked directories, which may loop
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append(entry.path)
+                    elif entry.name.endswith(MODEL_EXTENSIONS):
+                        path = os.path.abspath(entry.path)
+                        models.setdefault(entry.name, path)
+                        models.setdefault(os.path.splitext(entry.name)[0], path)
+        except OSError:
+            continue
+    
+    index = {
+        "dirs": _dir_mtimes(dirs) or {},
+        "models": models
+    }
+    
+    try:
+        with open(index_path, "wb") as f:
+            f.write(fast_json.dumps_bytes(index))
+    except OSError:
+        pass
+    
+    return index
+
+
+def _load_model_index() -> Dict[str, Any]:
+    """Load the model index, rebuilding it if the models directory has changed.
+    
+    Returns:
+        Dict[str, Any]: The model index
+    """
+    index_path = os.path.join(MODELS_DIR, MODEL_INDEX_FILE)
+    
+    try:
+        with open(index_path, "rb") as f:
+            index = fast_json.loads(f.read())
+        if index.get("dirs") and _dir_mtimes(list(index["dirs"])) == index["dirs"]:
+            return index
+    except (OSError, ValueError):
+        pass
+    
+    return _build_model_index()
+
+
 def find_model_path(model_name: str) -> Optional[str]:
     """Find the path to a model file.
     
@@ -81,28 +269,67 @@ def find_model_path(model_name: str) -> Optional[str]:
     if os.path.exists(model_path):
         return model_path
     
-    # Check for partial matches
-    for root, _, files in os.walk(MODELS_DIR):
-        for file in files:
-            if model_name in file and file.endswith((".gguf", ".bin")):
-                return os.path.join(root, file)
+    if not os.path.isdir(MODELS_DIR):
+        return None
+    
+    # Look the model up in the index, then check for partial matches
+    models = _load_model_index()["models"]
+    
+    if model_name in models:
+        return models[model_name]
+    
+    for name in sorted(models):
+        if model_name in name and name.endswith(MODEL_EXTENSIONS):
+            return models[name]
     
     return None
 
 
+def detect_threads() -> int:
+    """Detect the number of threads to use for inference.
+    
+    Hyperthreads slow llama.cpp down, so this counts physical cores only.
+    
+    Returns:
+        int: Number of physical cores, or 0 if unknown
+    """
+    try:
+        import psutil
+        cores = psutil.cpu_count(logical=False)
+    except ImportError:
+        cores = None
+        
+    return cores or os.cpu_count() or 0
+
+
+def has_gpu() -> bool:
+    """Check whether an NVIDIA GPU is available for offloading.
+    
+    Returns:
+        bool: Whether nvidia-smi is on the PATH
+    """
+    return shutil.which("nvidia-smi") is not None
+
+
 def start_server(model_name: str = DEFAULT_MODEL, 
                  host: str = DEFAULT_HOST,
                  port: int = DEFAULT_PORT,
                  n_ctx: int = DEFAULT_CONTEXT_SIZE,
-                 n_threads: int = DEFAULT_THREADS) -> Tuple[Optional[subprocess.Popen], Optional[str]]:
+                 n_threads: int = DEFAULT_THREADS,
+                 n_parallel: int = DEFAULT_PARALLEL,
+                 n_gpu_layers: int = DEFAULT_GPU_LAYERS) -> Tuple[Optional[subprocess.Popen], Optional[str]]:
     """Start the Llama.cpp server.
     
     Args:
         model_name: Name of the model file
         host: Host address to bind to
         port: Port number to bind to
-        n_ctx: Context size
-        n_threads: Number of threads to use
+        n_ctx: Context size per request
+        n_threads: Number of threads to use (0 to detect)
+        n_parallel: Number of requests to decode concurrently. The server's
+            total context (and KV cache memory) is n_ctx * n_parallel.
+        n_gpu_layers: Number of model layers to offload to the GPU (0 for CPU
+            only, -1 to offload all layers when a GPU is detected)
         
     Returns:
         Tuple[Optional[subprocess.Popen], Optional[str]]: Process object and error message if any
@@ -123,31 +350,56 @@ def start_server(model_name: str = DEFAULT_MODEL,
         "--model", model_path,
         "--host", host,
         "--port", str(port),
-        "--ctx-size", str(n_ctx)
+        # The context is split between parallel slots, so scale it to keep n_ctx per request
+        "--ctx-size", str(n_ctx * max(n_parallel, 1)),
+        "--parallel", str(max(n_parallel, 1)),
+        "--cont-batching"
     ]
     
+    if n_threads <= 0:
+        n_threads = detect_threads()
+    
     if n_threads > 0:
         cmd.extend(["--threads", str(n_threads)])
     
+    if n_gpu_layers < 0:
+        n_gpu_layers = 999 if has_gpu() else 0
+    
+    if n_gpu_layers > 0:
+        cmd.extend(["--n-gpu-layers", str(n_gpu_layers)])
+    
+    _invalidate_status(host, port)
+    
     try:
-        # Start the server as a background process
-        process = subprocess.Popen(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            bufsize=1,
-            universal_newlines=True
-        )
+        # Start the server as a background process. Its log goes straight to a
+        # file, so it never blocks on a pipe and keeps running after we exit.
+        with open(_log_file(port), "ab") as log:
+            log_offset = log.tell()
+            process = subprocess.Popen(
+                cmd,
+                stdout=subprocess.DEVNULL,
+                stderr=log,
+                start_new_session=True
+            )
         
-        # Give the server some time to start
-        time.sleep(2)
+        # Wait until the server opens its port, or exits
+        deadline = time.monotonic() + START_TIMEOUT
+        while time.monotonic() < deadline:
+            if process.poll() is not None or is_port_in_use(host, port):
+                break
+            time.sleep(POLL_INTERVAL)
         
         # Check if the process is still running
         if process.poll() is not None:
             # Process has terminated
-            stderr = process.stderr.read() if process.stderr else ""
-            return None, f"Server failed to start: {stderr}"
+            return None, f"Server failed to start: {_read_log(port, log_offset)}"
+        
+        # Remember the PID so stop_server doesn't have to search for the process
+        try:
+            with open(_pid_file(port), "w") as f:
+                f.write(str(process.pid))
+        except OSError:
+            pass
         
         return process, None
         
@@ -167,7 +419,36 @@ def stop_server(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> Tuple[boo
     """
     import psutil
     
-    # Find processes listening on the specified port
+    _invalidate_status(host, port)
+    
+    # Stop the server we started, if its PID file is still valid
+    pid_file = _pid_file(port)
+    try:
+        with open(pid_file, "r") as f:
+            pid = int(f.read().strip())
+    except (OSError, ValueError):
+        pid = None
+    
+    if pid is not None:
+        try:
+            os.remove(pid_file)
+        except OSError:
+            pass
+        
+        try:
+            proc = psutil.Process(pid)
+            # Guard against the PID having been reused by another process
+            if str(port) in proc.cmdline():
+                proc.terminate()
+                try:
+                    proc.wait(timeout=5)
+                except psutil.TimeoutExpired:
+                    proc.kill()
+                return True, None
+        except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+            pass
+    
+    # Otherwise find processes listening on the specified port
     for proc in psutil.process_iter(['pid', 'name', 'cmdline']):
         try:
             connections = proc.connections(kind='inet')
@@ -189,6 +470,28 @@ def stop_server(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> Tuple[boo
 def check_server_status(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> Dict[str, Any]:
     """Check the status of the Llama.cpp server.
     
+    Results are reused for STATUS_CACHE_TTL seconds, so repeated checks in a
+    loop don't reconnect to the server every time.
+    
+    Args:
+        host: Host address of the server
+        port: Port number of the server
+        
+    Returns:
+        Dict[str, Any]: Status information
+    """
+    cached = _STATUS_CACHE.get((host, port))
+    if cached and time.monotonic() - cached[0] < STATUS_CACHE_TTL:
+        return cached[1]
+        
+    status = _fetch_server_status(host, port)
+    _STATUS_CACHE[(host, port)] = (time.monotonic(), status)
+    return status
+
+
+def _fetch_server_status(host: str, port: int) -> Dict[str, Any]:
+    """Query the Llama.cpp server for its status, bypassing the cache.
+    
     Args:
         host: Host address of the server
         port: Port number of the server
@@ -203,12 +506,10 @@ def check_server_status(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> D
         }
     
     # Try to get server info through the API
-    import requests
-    
     try:
-        response = requests.get(f"http://{host}:{port}/v1/models")
+        response = _get_session().get(f"http://{host}:{port}/v1/models", timeout=STATUS_REQUEST_TIMEOUT)
         if response.status_code == 200:
-            models = response.json()
+            models = fast_json.loads(response.content)
             return {
                 "running": True,
                 "message": "Server is running",
@@ -229,15 +530,21 @@ def ensure_server_running(model_name: str = DEFAULT_MODEL,
                         host: str = DEFAULT_HOST,
                         port: int = DEFAULT_PORT,
                         n_ctx: int = DEFAULT_CONTEXT_SIZE,
-                        n_threads: int = DEFAULT_THREADS) -> Dict[str, Any]:
+                        n_threads: int = DEFAULT_THREADS,
+                        n_parallel: int = DEFAULT_PARALLEL,
+                        n_gpu_layers: int = DEFAULT_GPU_LAYERS) -> Dict[str, Any]:
     """Ensure the Llama.cpp server is running.
     
     Args:
         model_name: Name of the model file
         host: Host address to bind to
         port: Port number to bind to
-        n_ctx: Context size
-        n_threads: Number of threads to use
+        n_ctx: Context size per request
+        n_threads: Number of threads to use (0 to detect)
+        n_parallel: Number of requests to decode concurrently. The server's
+            total context (and KV cache memory) is n_ctx * n_parallel.
+        n_gpu_layers: Number of model layers to offload to the GPU (0 for CPU
+            only, -1 to offload all layers when a GPU is detected)
         
     Returns:
         Dict[str, Any]: Status information
@@ -249,7 +556,8 @@ def ensure_server_running(model_name: str = DEFAULT_MODEL,
         return status
     
     # Start the server
-    process, error = start_server(model_name, host, port, n_ctx, n_threads)
+    process, error = start_server(model_name, host, port, n_ctx, n_threads, n_parallel,
+                                  n_gpu_layers)
     
     if error:
         return {
@@ -257,8 +565,20 @@ def ensure_server_running(model_name: str = DEFAULT_MODEL,
             "message": error
         }
     
-    # Give the server some time to initialize
-    time.sleep(5)
+    # Wait for the server to finish loading the model and answer requests
+    deadline = time.monotonic() + READY_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            break
+        try:
+            response = _get_session().get(f"http://{host}:{port}/v1/models", timeout=READY_REQUEST_TIMEOUT)
+            if response.status_code == 200:
+                break
+        except Exception:
+            pass
+        time.sleep(POLL_INTERVAL)
+        
+    _invalidate_status(host, port)
     
     # Check status again
     return check_server_status(host, port)
@@ -281,7 +601,13 @@ def parse_args():
     start_parser.add_argument("--ctx-size", type=int, default=DEFAULT_CONTEXT_SIZE,
                             help="Context size")
     start_parser.add_argument("--threads", type=int, default=DEFAULT_THREADS,
-                            help="Number of threads to use")
+                            help="Number of threads to use (0 to use physical cores)")
+    start_parser.add_argument("--parallel", type=int, default=DEFAULT_PARALLEL,
+                            help="Number of requests to decode concurrently "
+                                 "(each one adds --ctx-size worth of KV cache memory)")
+    start_parser.add_argument("--n-gpu-layers", type=int, default=DEFAULT_GPU_LAYERS,
+                            help="Model layers to offload to the GPU "
+                                 "(0 for CPU only, -1 for all layers when a GPU is detected)")
     
     # Stop command
     stop_parser = subparsers.add_parser("stop", help="Stop the Llama.cpp server")
@@ -308,7 +634,13 @@ def parse_args():
     ensure_parser.add_argument("--ctx-size", type=int, default=DEFAULT_CONTEXT_SIZE,
                              help="Context size")
     ensure_parser.add_argument("--threads", type=int, default=DEFAULT_THREADS,
-                             help="Number of threads to use")
+                             help="Number of threads to use (0 to use physical cores)")
+    ensure_parser.add_argument("--parallel", type=int, default=DEFAULT_PARALLEL,
+                             help="Number of requests to decode concurrently "
+                                  "(each one adds --ctx-size worth of KV cache memory)")
+    ensure_parser.add_argument("--n-gpu-layers", type=int, default=DEFAULT_GPU_LAYERS,
+                             help="Model layers to offload to the GPU "
+                                  "(0 for CPU only, -1 for all layers when a GPU is detected)")
     
     return parser.parse_args()
 
@@ -323,7 +655,9 @@ def main():
             args.host,
             args.port,
             args.ctx_size,
-            args.threads
+            args.threads,
+            args.parallel,
+            args.n_gpu_layers
         )
         
         if error:
@@ -343,7 +677,7 @@ def main():
         
     elif args.command == "status":
         status = check_server_status(args.host, args.port)
-        print(json.dumps(status, indent=2))
+        print(fast_json.dumps(status, indent=True))
         
     elif args.command == "ensure":
         status = ensure_server_running(
@@ -351,10 +685,12 @@ def main():
             args.host,
             args.port,
             args.ctx_size,
-            args.threads
+            args.threads,
+            args.parallel,
+            args.n_gpu_layers
         )
         
-        print(json.dumps(status, indent=2))
+        print(fast_json.dumps(status, indent=True))
         
         if not status["running"]:
             sys.exit(1)
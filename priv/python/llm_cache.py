@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Response cache for LLM extraction calls.
+This module caches extraction results so identical pages are not sent to the LLM twice.
+"""
+
+import hashlib
+import json
+import os
+import time
+from typing import Dict, Any, Optional, Tuple
+
+# Default settings
+DEFAULT_TTL = 3600  # 1 hour
+DEFAULT_MAX_ENTRIES = 1024  # in-memory entries kept before the oldest are dropped
+REDIS_URL = os.environ.get("LLM_CACHE_REDIS_URL")
+
+
+def make_key(schema_name: str, model_name: str, html: str,
+             instructions: Optional[str] = None) -> str:
+    """Build an exact-match cache key for an extraction request.
+
+    Args:
+        schema_name: Name of the schema being extracted
+        model_name: Name of the LLM model
+        html: HTML content of the page
+        instructions: Optional specific instructions for extraction
+
+    Returns:
+        str: SHA-256 hex digest identifying the request
+    """
+    # Collapse whitespace so formatting-only differences still hit the cache
+    html_normalized = " ".join(html.split())
+    html_digest = hashlib.sha256(html_normalized.encode("utf-8")).hexdigest()
+
+    payload = json.dumps({
+        "schema": schema_name,
+        "model": model_name,
+        "html": html_digest,
+        "instr": instructions
+    }, sort_keys=True)
+
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """Exact-key cache for LLM responses, in memory or in Redis."""
+
+    def __init__(self, backend: Optional[Any] = None, ttl: int = DEFAULT_TTL,
+                 max_entries: int = DEFAULT_MAX_ENTRIES):
+        """Initialize the cache.
+
+        Args:
+            backend: Optional redis.Redis client. If not provided, an in-memory dict is used.
+            ttl: Time to live for cached entries in seconds
+            max_entries: Maximum number of entries kept by the in-memory store
+        """
+        self.backend = backend
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # Insertion ordered, so the first entry is always the oldest
+        self._store: Dict[str, Tuple[float, Any]] = {}
+
+    def get(self, key: str) -> Optional[Any]:
+        """Get a cached value by exact key.
+
+        Args:
+            key: Cache key
+
+        Returns:
+            Optional[Any]: The cached value, or None if missing or expired
+        """
+        if self.backend is not None:
+            try:
+                raw = self.backend.get(f"llm_cache:{key}")
+            except Exception:
+                return None
+            return json.loads(raw) if raw is not None else None
+
+        entry = self._store.get(key)
+        if entry is None:
+            return None
+
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._store[key]
+            return None
+
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        """Store a value in the cache.
+
+        Args:
+            key: Cache key
+            value: JSON-serializable value to store
+        """
+        if self.backend is not None:
+            try:
+                self.backend.set(f"llm_cache:{key}", json.dumps(value), ex=self.ttl)
+            except Exception:
+                pass
+            return
+
+        now = time.monotonic()
+        self._store.pop(key, None)
+
+        if len(self._store) >= self.max_entries:
+            self._prune(now)
+
+        self._store[key] = (now + self.ttl, value)
+
+    def _prune(self, now: float) -> None:
+        """Drop expired entries, then the oldest ones if the store is still full.
+
+        Args:
+            now: Current time.monotonic() value
+        """
+        for key in [key for key, (expires_at, _) in self._store.items() if expires_at < now]:
+            del self._store[key]
+
+        while len(self._store) >= self.max_entries:
+            del self._store[next(iter(self._store))]
+
+
+_default_cache: Optional[LLMCache] = None
+
+
+def get_default_cache() -> LLMCache:
+    """Get the process-wide cache, backed by Redis if LLM_CACHE_REDIS_URL is set.
+
+    Returns:
+        LLMCache: The shared cache instance
+    """
+    global _default_cache
+
+    if _default_cache is None:
+        backend = None
+        if REDIS_URL:
+            try:
+                import redis
+                backend = redis.Redis.from_url(REDIS_URL)
+            except ImportError:
+                backend = None
+        _default_cache = LLMCache(backend)
+
+    return _default_cache
@@ -5,14 +5,19 @@ This script demonstrates using the proxy-lite-3b model for web automation tasks.
 """
 
 import argparse
+import asyncio
+import inspect
 import json
 import os
 import sys
+import traceback
 import base64
 from typing import Dict, List, Optional, Union, Any
 
 try:
     import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
     from proxy_lite import ProxyLite3B
     from pydantic import BaseModel, Field
 except ImportError:
@@ -25,11 +30,22 @@ sys.path.insert(0, script_dir)
 
 try:
     from web_automation import WebAutomator
+    from llm_cache import get_default_cache, make_key
+    from html_cleaner import clean_html
+    import fast_json
 except ImportError:
-    print(json.dumps({"error": "Could not import web_automation. Make sure it's in the same directory."}))
+    print(json.dumps({"error": "Could not import web_automation or llm_cache. Make sure they're in the same directory."}))
     sys.exit(1)
 
 
+# Shared keep-alive HTTP session for API calls
+_SESSION = requests.Session()
+_ADAPTER = HTTPAdapter(pool_connections=16, pool_maxsize=64,
+                       max_retries=Retry(total=2, backoff_factor=0.1))
+_SESSION.mount("http://", _ADAPTER)
+_SESSION.mount("https://", _ADAPTER)
+
+
 class SearchRequest(BaseModel):
     """Model for a search request."""
     query: str = Field(..., description="The search query")
@@ -65,10 +81,17 @@ class ProxyLite3BAutomation:
             debug: Whether to enable debug mode
         """
         self.debug = debug
-        self.client = ProxyLite3B(
-            api_key=api_key,
-            api_base=api_base
-        )
+        
+        client_kwargs = {
+            "api_key": api_key,
+            "api_base": api_base
+        }
+        
+        # Reuse pooled connections if the client accepts a session
+        if "session" in inspect.signature(ProxyLite3B).parameters:
+            client_kwargs["session"] = _SESSION
+            
+        self.client = ProxyLite3B(**client_kwargs)
         
     def _screenshot_to_base64(self, image_path: str) -> str:
         """Convert a screenshot to base64.
@@ -82,61 +105,81 @@ class ProxyLite3BAutomation:
         with open(image_path, "rb") as f:
             return base64.b64encode(f.read()).decode("utf-8")
     
-    def search(self, request: SearchRequest) -> Dict[str, Any]:
-        """Perform a search on the web.
+    def _browse(self, automator: WebAutomator, request: SearchRequest) -> Dict[str, Any]:
+        """Run the browser stage of a search: open the homepage and submit the query.
+        
+        Args:
+            automator: A started WebAutomator instance
+            request: Search request parameters
+            
+        Returns:
+            Dict: The results page HTML and screenshot, or an error
+        """
+        # Navigate to the homepage. Only the results page is sent to the model,
+        # so skip capturing the homepage HTML and screenshot.
+        navigation_result = automator.navigate(request.homepage, capture=False)
+        
+        if not navigation_result.get("success", False):
+            return {
+                "success": False,
+                "error": navigation_result.get("error", "Navigation failed"),
+                "query": request.query
+            }
+        
+        # Perform the search
+        search_result = automator.search(request.query)
+        
+        if not search_result.get("success", False):
+            return {
+                "success": False,
+                "error": search_result.get("error", "Search failed"),
+                "query": request.query
+            }
+        
+        # Get the updated screenshot and HTML after search
+        return {
+            "success": True,
+            "html": search_result.get("html", ""),
+            "screenshot": search_result.get("screenshot", "")
+        }
+        
+    def _extract_results(self, request: SearchRequest, browse_result: Dict[str, Any]) -> Dict[str, Any]:
+        """Run the LLM stage of a search: extract results from the results page.
         
         Args:
             request: Search request parameters
+            browse_result: Result of _browse for the same request
             
         Returns:
             Dict: Search results
         """
+        if not browse_result.get("success", False):
+            return browse_result
+            
         try:
-            # Initialize WebAutomator
-            with WebAutomator(headless=True, debug=self.debug) as automator:
-                # Navigate to the homepage
-                navigation_result = automator.navigate(request.homepage)
-                
-                if not navigation_result.get("success", False):
-                    return {
-                        "success": False,
-                        "error": navigation_result.get("error", "Navigation failed"),
-                        "query": request.query
-                    }
-                
-                # Take a screenshot base64 from the result
-                screenshot_base64 = navigation_result.get("screenshot", "")
-                
-                # Get the HTML
-                html = navigation_result.get("html", "")
-                
-                # Perform the search
-                search_result = automator.search(request.query)
-                
-                if not search_result.get("success", False):
-                    return {
-                        "success": False,
-                        "error": search_result.get("error", "Search failed"),
-                        "query": request.query
-                    }
-                
-                # Get the updated screenshot and HTML after search
-                search_screenshot = search_result.get("screenshot", "")
-                search_html = search_result.get("html", "")
-                
-                # Use the proxy-lite-3b model to extract search results
-                prompt = f"""
-                I need you to extract search results from this web page. 
-                
-                The user searched for: {request.query}
-                The website is: {request.homepage}
-                
-                Please extract up to {request.max_results} search results.
-                Each result should have a title, URL, and a brief snippet or description.
-                
-                Focus only on actual search results, not ads or other elements.
-                """
-                
+            search_screenshot = browse_result["screenshot"]
+            # Send only content markup; raw results pages are mostly scripts and styles
+            search_html = clean_html(browse_result["html"], "search_result")
+            
+            # Use the proxy-lite-3b model to extract search results
+            prompt = f"""
+            I need you to extract search results from this web page. 
+            
+            The user searched for: {request.query}
+            The website is: {request.homepage}
+            
+            Please extract up to {request.max_results} search results.
+            Each result should have a title, URL, and a brief snippet or description.
+            
+            Focus only on actual search results, not ads or other elements.
+            """
+            
+            # Reuse a cached extraction for the same results page if we have one
+            cache = get_default_cache()
+            cache_key = make_key("search_response", "proxy-lite-3b", search_html, prompt)
+            results = cache.get(cache_key)
+            
+            if results is None:
                 # Call the model with both visual and HTML context
                 response = self.client.extract(
                     model=SearchResponse,
@@ -144,22 +187,93 @@ class ProxyLite3BAutomation:
                     html=search_html,
                     image_data=search_screenshot
                 )
-                
-                return {
-                    "success": True,
-                    "query": request.query,
-                    "results": response.model_dump(),
-                    "screenshot": search_screenshot
-                }
-                
-        except Exception as e:
-            import traceback
+                results = response.model_dump()
+                cache.set(cache_key, results)
+            
             return {
-                "success": False,
-                "error": str(e),
-                "traceback": traceback.format_exc() if self.debug else None,
-                "query": request.query
+                "success": True,
+                "query": request.query,
+                "results": results,
+                "screenshot": search_screenshot
             }
+            
+        except Exception as e:
+            return self._error_result(request, e)
+            
+    def _error_result(self, request: SearchRequest, error: Exception) -> Dict[str, Any]:
+        """Build the result for a search that raised an exception.
+        
+        Args:
+            request: Search request parameters
+            error: The exception raised
+            
+        Returns:
+            Dict: Error result
+        """
+        return {
+            "success": False,
+            "error": str(error),
+            "traceback": traceback.format_exc() if self.debug else None,
+            "query": request.query
+        }
+    
+    def search(self, request: SearchRequest) -> Dict[str, Any]:
+        """Perform a search on the web.
+        
+        Args:
+            request: Search request parameters
+            
+        Returns:
+            Dict: Search results
+        """
+        try:
+            # Initialize WebAutomator
+            with WebAutomator(headless=True, debug=self.debug) as automator:
+                browse_result = self._browse(automator, request)
+                
+        except Exception as e:
+            return self._error_result(request, e)
+            
+        return self._extract_results(request, browse_result)
+        
+    async def search_many(self, requests: List[SearchRequest]) -> List[Dict[str, Any]]:
+        """Perform several searches, overlapping browsing with extraction.
+        
+        One browser runs the searches one after another on a worker thread. As
+        soon as a results page is ready its LLM extraction starts, so extraction
+        of one search runs while the browser works on the next.
+        
+        Args:
+            requests: Search request parameters
+            
+        Returns:
+            List[Dict]: Search results, in the same order as requests
+        """
+        loop = asyncio.get_running_loop()
+        extractions: List[Optional[asyncio.Future]] = [None] * len(requests)
+        
+        def start_extraction(index: int, browse_result: Dict[str, Any]) -> None:
+            extractions[index] = loop.run_in_executor(
+                None, self._extract_results, requests[index], browse_result
+            )
+            
+        def browse_all() -> None:
+            index = 0
+            try:
+                with WebAutomator(headless=True, debug=self.debug) as automator:
+                    for index, request in enumerate(requests):
+                        browse_result = self._browse(automator, request)
+                        loop.call_soon_threadsafe(start_extraction, index, browse_result)
+                    index = len(requests)
+            except Exception as e:
+                # Fail the searches that never reached the extraction stage
+                for failed in range(index, len(requests)):
+                    loop.call_soon_threadsafe(
+                        start_extraction, failed, self._error_result(requests[failed], e)
+                    )
+                    
+        await loop.run_in_executor(None, browse_all)
+        return list(await asyncio.gather(*extractions))
 
 
 def parse_args():
@@ -204,16 +318,13 @@ def main():
     # Perform the search
     result = automation.search(request)
     
-    # Format the result as JSON
-    json_result = json.dumps(result, indent=2)
-    
-    # Output the result
+    # Output the result as JSON
     if args.output:
-        with open(args.output, "w") as f:
-            f.write(json_result)
+        with open(args.output, "wb") as f:
+            fast_json.dump(result, f, indent=True)
         print(f"Result saved to {args.output}")
     else:
-        print(json_result)
+        print(fast_json.dumps(result, indent=True))
 
 
 if __name__ == "__main__":
@@ -4,16 +4,31 @@ Setup script for the web automation component.
 This script installs the required dependencies, initializes Playwright, and ensures the Llama server is running.
 """
 
+import hashlib
+import http.client
+import importlib.util
 import os
+import runpy
 import subprocess
 import sys
 import json
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Any, Optional, Tuple
+from urllib.parse import urlparse
 
 # Add the current directory to the Python path
 script_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, script_dir)
 
+# Timeout for the setup health checks
+HEALTH_CHECK_TIMEOUT = 1.0  # seconds
+
+# Scripts that setup makes executable
+EXECUTABLE_SCRIPTS = {
+    "web_automation.py", "structured_extraction.py", "extract_example.py",
+    "llama_server.py", "proxy_lite_example.py", "worker_pool.py"
+}
+
 # Try to import the llama_server module
 try:
     from llama_server import ensure_server_running, DEFAULT_MODEL, DEFAULT_HOST, DEFAULT_PORT
@@ -35,15 +50,107 @@ def run_command(command: List[str], env: Optional[Dict[str, Any]] = None) -> int
     Returns:
         int: Exit code of the command
     """
-    process_env = os.environ.copy()
-    if env:
-        process_env.update(env)
+    # Without overrides the child simply inherits this process's environment
+    process_env = {**os.environ, **env} if env else None
         
     print(f"Running command: {' '.join(command)}")
     process = subprocess.run(command, env=process_env)
     return process.returncode
 
 
+def run_module(module: str, args: List[str]) -> int:
+    """Run a Python module as a script in this interpreter, like `python -m`.
+    
+    This saves starting a second interpreter for tools such as pip.
+    
+    Args:
+        module: Name of the module to run
+        args: Command line arguments for the module
+        
+    Returns:
+        int: Exit code of the module
+    """
+    print(f"Running module: {module} {' '.join(args)}")
+    saved_argv = sys.argv
+    sys.argv = [module] + args
+    try:
+        runpy.run_module(module, run_name="__main__", alter_sys=True)
+        return 0
+    except SystemExit as e:
+        if e.code is None or isinstance(e.code, int):
+            return e.code or 0
+        print(e.code)
+        return 1
+    except Exception as e:
+        print(f"Error running {module}: {str(e)}")
+        return 1
+    finally:
+        sys.argv = saved_argv
+
+
+def http_get_ok(url: str, timeout: float = HEALTH_CHECK_TIMEOUT) -> bool:
+    """Check whether a GET request to a URL returns 200.
+    
+    Args:
+        url: The URL to request
+        timeout: Connection and read timeout in seconds
+        
+    Returns:
+        bool: Whether the response status was 200
+    """
+    parsed = urlparse(url)
+    connection_class = http.client.HTTPSConnection if parsed.scheme == "https" else http.client.HTTPConnection
+    connection = connection_class(parsed.hostname, parsed.port, timeout=timeout)
+    try:
+        connection.request("GET", parsed.path or "/")
+        return connection.getresponse().status == 200
+    finally:
+        connection.close()
+
+
+def _playwright_browsers_dir() -> str:
+    """Get the directory Playwright downloads its browsers to.
+    
+    Returns:
+        str: The browsers directory
+    """
+    if os.environ.get("PLAYWRIGHT_BROWSERS_PATH", "0") != "0":
+        return os.environ["PLAYWRIGHT_BROWSERS_PATH"]
+        
+    if sys.platform == "darwin":
+        return os.path.expanduser("~/Library/Caches/ms-playwright")
+    if sys.platform == "win32":
+        return os.path.join(os.environ.get("LOCALAPPDATA", os.path.expanduser("~")), "ms-playwright")
+    return os.path.expanduser("~/.cache/ms-playwright")
+
+
+def chromium_installed() -> bool:
+    """Check whether a Playwright Chromium build has already been downloaded.
+    
+    Returns:
+        bool: Whether a chromium-* directory exists in the browsers directory
+    """
+    try:
+        return any(name.startswith("chromium-") for name in os.listdir(_playwright_browsers_dir()))
+    except OSError:
+        return False
+
+
+def _requirements_hash(requirements_path: str) -> str:
+    """Hash requirements.txt together with the interpreter it is installed into.
+    
+    Args:
+        requirements_path: Path to requirements.txt
+        
+    Returns:
+        str: Hex digest
+    """
+    digest = hashlib.sha256(sys.executable.encode("utf-8"))
+    with open(requirements_path, "rb") as f:
+        digest.update(f.read())
+    return digest.hexdigest()
+
+
 def setup_python_env() -> bool:
     """Set up the Python environment.
     
@@ -54,25 +161,52 @@ def setup_python_env() -> bool:
     current_dir = os.path.dirname(os.path.abspath(__file__))
     requirements_path = os.path.join(current_dir, "requirements.txt")
     
+    sessions_dir = os.path.join(current_dir, "sessions")
+    requirements_stamp = os.path.join(sessions_dir, ".reqs.sha256")
+    
     try:
-        # Install dependencies
-        print("Installing Python dependencies...")
-        exit_code = run_command([sys.executable, "-m", "pip", "install", "-r", requirements_path])
-        if exit_code != 0:
-            print(f"Error installing dependencies: exit code {exit_code}")
-            return False
-            
-        # Install Playwright browsers
-        print("Installing Playwright browsers...")
-        exit_code = run_command([sys.executable, "-m", "playwright", "install", "chromium"])
-        if exit_code != 0:
-            print(f"Error installing Playwright browsers: exit code {exit_code}")
-            return False
-            
         # Create the sessions directory
-        sessions_dir = os.path.join(current_dir, "sessions")
         os.makedirs(sessions_dir, exist_ok=True)
         
+        # Install dependencies, unless this requirements.txt was already installed
+        requirements_hash = _requirements_hash(requirements_path)
+        try:
+            with open(requirements_stamp, "r") as f:
+                installed_hash = f.read().strip()
+        except OSError:
+            installed_hash = None
+            
+        if installed_hash == requirements_hash:
+            print("Python dependencies are up to date.")
+        else:
+            print("Installing Python dependencies...")
+            pip_args = ["install", "-r", requirements_path]
+            if sys.prefix != sys.base_prefix:
+                exit_code = run_module("pip", pip_args)
+            else:
+                # Outside a virtualenv pip may fall back to a user site-packages that
+                # this interpreter only adds to sys.path at startup, so run it separately
+                exit_code = run_command([sys.executable, "-m", "pip"] + pip_args)
+            if exit_code != 0:
+                print(f"Error installing dependencies: exit code {exit_code}")
+                return False
+                
+            # Let this process import the packages that were just installed
+            importlib.invalidate_caches()
+            
+            with open(requirements_stamp, "w") as f:
+                f.write(requirements_hash)
+                
+        # Install Playwright browsers, unless Chromium was already downloaded
+        if chromium_installed():
+            print("Playwright Chromium is already installed.")
+        else:
+            print("Installing Playwright browsers...")
+            exit_code = run_command([sys.executable, "-m", "playwright", "install", "chromium"])
+            if exit_code != 0:
+                print(f"Error installing Playwright browsers: exit code {exit_code}")
+                return False
+                
         print("Python environment setup complete!")
         return True
         
@@ -95,10 +229,8 @@ def ensure_llama_server() -> bool:
             
         print("Checking Llama.cpp server status...")
         
-        # Try to import the required modules
-        try:
-            import requests
-        except ImportError:
+        # Check the required modules are installed, without paying for importing them here
+        if importlib.util.find_spec("requests") is None:
             print("Warning: requests module not available. Cannot check server status.")
             return False
             
@@ -155,9 +287,7 @@ def check_and_setup_proxy_lite() -> bool:
                 # Check if Ollama is running (if we're using it)
                 ollama_url = os.environ.get("OLLAMA_BASE_URL", "http://localhost:11434")
                 try:
-                    import requests
-                    response = requests.get(f"{ollama_url}/api/version")
-                    if response.status_code == 200:
+                    if http_get_ok(f"{ollama_url}/api/version"):
                         print(f"Ollama is available at {ollama_url}")
                     else:
                         print(f"Warning: Ollama may not be running at {ollama_url}")
@@ -183,34 +313,38 @@ def main():
     """Main entry point."""
     success = True
     
-    # Setup Python environment
+    # Setup Python environment. This comes first because the checks below
+    # import the packages it installs.
     env_success = setup_python_env()
     success = success and env_success
     
-    # Ensure Llama.cpp server is running
-    llama_success = ensure_llama_server()
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        # Ensure Llama.cpp server is running and check proxy-lite, concurrently
+        llama_future = executor.submit(ensure_llama_server)
+        proxy_future = executor.submit(check_and_setup_proxy_lite)
+        
+        # Make the scripts executable while the checks run
+        try:
+            # One directory read instead of a stat per script
+            with os.scandir(os.path.dirname(os.path.abspath(__file__))) as entries:
+                for entry in entries:
+                    if entry.name in EXECUTABLE_SCRIPTS and entry.is_file():
+                        os.chmod(entry.path, 0o755)
+                        print(f"Made {entry.name} executable.")
+        except Exception as e:
+            print(f"Warning: Could not make scripts executable: {str(e)}")
+            
+        llama_success = llama_future.result()
+        proxy_success = proxy_future.result()
+        
     # Don't fail the setup if Llama server isn't available, just warn
     if not llama_success:
         print("Warning: Llama.cpp server is not running. Some features may not work.")
     
-    # Check and setup proxy-lite
-    proxy_success = check_and_setup_proxy_lite()
     # Don't fail the setup if proxy-lite isn't available, just warn
     if not proxy_success:
         print("Warning: Proxy-lite configuration check failed. Some features may not work.")
     
-    # Make the scripts executable
-    try:
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        for script in ["web_automation.py", "structured_extraction.py", "extract_example.py", 
-                     "llama_server.py", "proxy_lite_example.py"]:
-            script_path = os.path.join(script_dir, script)
-            if os.path.exists(script_path):
-                os.chmod(script_path, 0o755)
-                print(f"Made {script} executable.")
-    except Exception as e:
-        print(f"Warning: Could not make scripts executable: {str(e)}")
-    
     if success:
         print("\n✅ Setup completed successfully!")
         print("\nYou can now use the following components:")
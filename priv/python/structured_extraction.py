@@ -5,22 +5,82 @@ This module extracts structured data from web pages using LLMs and Pydantic mode
 """
 
 import argparse
-import json
+import asyncio
+import functools
 import os
+import string
 import sys
+import traceback
 from typing import Dict, Any, List, Optional, Type, Union, TypeVar
 
+# Add the current directory to the Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fast_json
+from lazy_import import lazyload
+
+# proxy_lite is only loaded once a client is created; the schemas below need pydantic right away
+proxy_lite = lazyload("proxy_lite")
 try:
-    from proxy_lite import Ollama
     from pydantic import BaseModel, Field
 except ImportError:
-    print(json.dumps({"error": "Required libraries not installed. Please run: pip install proxy-lite pydantic"}))
+    BaseModel = None
+
+if proxy_lite is None or BaseModel is None:
+    print(fast_json.dumps({"error": "Required libraries not installed. Please run: pip install proxy-lite pydantic"}))
     sys.exit(1)
 
 
 # Type variable for generic model types
 T = TypeVar('T', bound=BaseModel)
 
+# Default context window of the model, and the part of it kept free for the response
+DEFAULT_CONTEXT_SIZE = 4096
+RESERVED_OUTPUT_TOKENS = 512
+
+# Fixed start of every extraction prompt
+PROMPT_PREFIX_TEMPLATE = string.Template("""
+        I need to extract structured information from the following webpage.
+        
+        I need to extract data according to this schema:
+        $schema_info
+        
+        """)
+
+
+@functools.lru_cache(maxsize=None)
+def _get_encoding():
+    """Get the tiktoken encoding used to estimate prompt sizes.
+    
+    Returns:
+        Optional[tiktoken.Encoding]: The encoding, or None if tiktoken is not
+            installed or its encoding file can't be downloaded (e.g. offline)
+    """
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        # Cached like a result, so the download isn't retried on every call
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Estimate the number of tokens in a text.
+    
+    Uses tiktoken's cl100k_base encoding when available, which is close enough
+    to the tokenizers of the local models, and about 4 characters per token otherwise.
+    
+    Args:
+        text: Text to count
+        
+    Returns:
+        int: Estimated number of tokens
+    """
+    encoding = _get_encoding()
+    if encoding is None:
+        return len(text) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
 
 class WebPage(BaseModel):
     """A simple model for a web page."""
@@ -32,14 +92,17 @@ class WebPage(BaseModel):
 class ExtractorClient:
     """Client for extracting structured data from web pages using LLMs."""
     
-    def __init__(self, model_name: str = "qwen2:7b", base_url: str = "http://localhost:11434"):
+    def __init__(self, model_name: str = "qwen2:7b", base_url: str = "http://localhost:11434",
+                 n_ctx: int = DEFAULT_CONTEXT_SIZE):
         """Initialize the extractor client.
         
         Args:
             model_name: Name of the Ollama model to use
             base_url: Base URL of the Ollama API
+            n_ctx: Context size of the model, used to reject prompts that can't fit
         """
-        self.client = Ollama(model=model_name, base_url=base_url)
+        self.client = proxy_lite.Ollama(model=model_name, base_url=base_url)
+        self.n_ctx = n_ctx
         
     def extract_data(self, webpage: WebPage, schema: Type[T], 
                      instructions: Optional[str] = None) -> Dict[str, Any]:
@@ -57,6 +120,17 @@ class ExtractorClient:
             # Generate a prompt for the LLM
             prompt = self._generate_extraction_prompt(webpage, schema, instructions)
             
+            # Don't spend LLM time on a prompt that won't fit in the context window
+            tokens = count_tokens(prompt)
+            if tokens > self.n_ctx - RESERVED_OUTPUT_TOKENS:
+                return {
+                    "success": False,
+                    "error": "input too large after cleaning",
+                    "tokens": tokens,
+                    "model": schema.__name__,
+                    "url": webpage.url
+                }
+            
             # Call the LLM for structured extraction
             response = self.client.extract(schema, prompt)
             
@@ -71,7 +145,6 @@ class ExtractorClient:
             }
             
         except Exception as e:
-            import traceback
             return {
                 "success": False,
                 "error": str(e),
@@ -80,6 +153,24 @@ class ExtractorClient:
                 "url": webpage.url if webpage else None
             }
             
+    async def aextract_data(self, webpage: WebPage, schema: Type[T],
+                            instructions: Optional[str] = None) -> Dict[str, Any]:
+        """Extract structured data from a web page without blocking the event loop.
+        
+        The blocking LLM call runs in the default executor, so several extractions
+        can be awaited together with asyncio.gather.
+        
+        Args:
+            webpage: WebPage object containing the HTML content
+            schema: Pydantic model schema to extract
+            instructions: Optional specific instructions for extraction
+            
+        Returns:
+            Dict: Result containing structured data or error
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.extract_data, webpage, schema, instructions)
+        
     def _generate_extraction_prompt(self, webpage: WebPage, schema: Type[BaseModel],
                                    instructions: Optional[str] = None) -> str:
         """Generate a prompt for structured data extraction.
@@ -95,21 +186,15 @@ class ExtractorClient:
         # Get the schema documentation from the model
         schema_info = self._get_schema_info(schema)
         
-        # Build the prompt
-        prompt = f"""
-        I need to extract structured information from the following webpage:
-        
-        URL: {webpage.url}
-        Title: {webpage.title}
-        
-        I need to extract data according to this schema:
-        {schema_info}
-        
-        """
+        # Build the prompt. The fixed parts come first so the LLM server can
+        # reuse its cached prefix across pages extracted with the same schema.
+        prompt = PROMPT_PREFIX_TEMPLATE.substitute(schema_info=schema_info)
         
         if instructions:
             prompt += f"\nAdditional instructions: {instructions}\n"
             
+        prompt += f"\nURL: {webpage.url}\nTitle: {webpage.title}\n"
+            
         # Add a portion of the HTML content (to avoid token limits)
         html_preview = webpage.html[:10000] + ("..." if len(webpage.html) > 10000 else "")
         prompt += f"\nHTML Content:\n{html_preview}"
@@ -125,18 +210,33 @@ class ExtractorClient:
         Returns:
             str: Schema information
         """
-        schema_info = f"Schema: {schema.__name__}\n\n"
+        return get_schema_info(schema)
+
+
+@functools.lru_cache(maxsize=None)
+def get_schema_info(schema: Type[BaseModel]) -> str:
+    """Get schema information from a Pydantic model.
+    
+    Schema classes don't change, so the result is cached per class.
+    
+    Args:
+        schema: Pydantic model schema
         
-        for field_name, field in schema.model_fields.items():
-            field_type = field.annotation
-            description = field.description or "No description"
-            required = "Required" if field.is_required() else "Optional"
-            
-            schema_info += f"- {field_name}: {field_type}\n"
-            schema_info += f"  Description: {description}\n"
-            schema_info += f"  {required}\n\n"
-            
-        return schema_info
+    Returns:
+        str: Schema information
+    """
+    schema_info = f"Schema: {schema.__name__}\n\n"
+    
+    for field_name, field in schema.model_fields.items():
+        field_type = field.annotation
+        description = field.description or "No description"
+        required = "Required" if field.is_required() else "Optional"
+        
+        schema_info += f"- {field_name}: {field_type}\n"
+        schema_info += f"  Description: {description}\n"
+        schema_info += f"  {required}\n\n"
+        
+    return schema_info
 
 
 # Example models for extraction
@@ -224,7 +324,7 @@ def main():
     result = client.extract_data(webpage, schema, instructions=args.instructions)
     
     # Print result as JSON
-    print(json.dumps(result))
+    print(fast_json.dumps(result))
 
 
 if __name__ == "__main__":
@@ -5,24 +5,166 @@ This script is called by the Elixir code to perform web automation tasks.
 """
 
 import argparse
-import json
+import asyncio
+import base64
+import hashlib
 import os
 import sys
+import traceback
 import uuid
 from datetime import datetime
 from pathlib import Path
 from typing import Dict, List, Optional, Union, Any
 
-try:
-    from playwright.sync_api import sync_playwright, Page, Browser
-except ImportError:
-    print(json.dumps({"error": "Playwright is not installed. Please run: pip install playwright"}))
+# Add the current directory to the Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fast_json
+from lazy_import import lazyload
+
+# Playwright takes a noticeable time to import, so it is only loaded once a browser is started
+playwright_sync = lazyload("playwright.sync_api")
+if playwright_sync is None:
+    print(fast_json.dumps({"error": "Playwright is not installed. Please run: pip install playwright"}))
     sys.exit(1)
 
+# Optional, for --output-format zstd
+zstandard = lazyload("zstandard")
+# Optional SIMD base64 encoder for screenshots; the standard library is used otherwise
+pybase64 = lazyload("pybase64")
+
 # Define global settings
 DEFAULT_TIMEOUT = 30000  # 30 seconds
 DEFAULT_WAIT_UNTIL = "load"  # "load", "domcontentloaded", "networkidle"
 SESSION_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sessions")
+SCREENSHOT_QUALITY = 60
+DEFAULT_HTML_LIMIT = 20000  # characters of HTML returned by the CLI and worker; 0 for no limit
+MAX_OPEN_SESSIONS = 32  # browser contexts kept open by a long-lived automator; idle ones beyond this are closed
+# Where screenshots go when returned by path; shared memory avoids touching disk
+SCREENSHOT_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else SESSION_DIR
+SEARCH_INPUT_SELECTORS = [
+    "input[type='search']",
+    "input[name='q']",
+    "input[name='query']",
+    "input[name='search']",
+    "input.search",
+    "#search-input",
+    ".search-input"
+]
+SEARCH_INPUT_SELECTOR = ", ".join(SEARCH_INPUT_SELECTORS)
+HUMAN_TYPING_DELAY = 100  # milliseconds between keystrokes when simulating a human
+ZSTD_LEVEL = 1  # fastest zstd level; HTML still compresses several times over
+# Serializes the page in the browser without scripts and styles (JSON-LD is kept),
+# returning only the first `limit` characters and the full length
+LIMITED_HTML_SCRIPT = """(limit) => {
+    const root = document.documentElement.cloneNode(true);
+    root.querySelectorAll('script:not([type="application/ld+json"]), style, noscript')
+        .forEach((el) => el.remove());
+    const html = root.outerHTML;
+    return [html.slice(0, limit), html.length];
+}"""
+
+
+def screenshot_options(mode: str = "true") -> Optional[Dict[str, Any]]:
+    """Get the Playwright screenshot arguments for a screenshot mode.
+    
+    Screenshots are JPEGs, which are much smaller and faster to encode than PNGs.
+    
+    Args:
+        mode: "false" for no screenshot, "true" for the viewport, or "full"
+            for the whole page
+            
+    Returns:
+        Optional[Dict]: Arguments for page.screenshot, or None for no screenshot
+    """
+    if mode == "false":
+        return None
+        
+    return {"type": "jpeg", "quality": SCREENSHOT_QUALITY, "full_page": mode == "full"}
+
+
+def encode_screenshot(data: bytes, name: str, output: str = "base64") -> Dict[str, Any]:
+    """Package screenshot bytes for the JSON response.
+    
+    Args:
+        data: The image bytes
+        name: File name to use when writing the screenshot to a file
+        output: "base64" to embed the image in the response, or "path" to write
+            it to SCREENSHOT_DIR and return only its path
+            
+    Returns:
+        Dict: Either a "screenshot" or a "screenshot_path" entry
+    """
+    if output == "path":
+        screenshot_path = os.path.join(SCREENSHOT_DIR, name)
+        with open(screenshot_path, "wb") as f:
+            f.write(data)
+        return {"screenshot_path": screenshot_path, "screenshot_type": "jpeg"}
+        
+    if pybase64 is not None:
+        encoded = pybase64.b64encode_as_string(data)
+    else:
+        encoded = base64.b64encode(data).decode("ascii")
+    return {"screenshot": encoded, "screenshot_type": "jpeg"}
+
+
+def remove_screenshots(session_id: str) -> None:
+    """Delete the screenshot files written for a session.
+    
+    Screenshots returned by path live in SCREENSHOT_DIR, which is usually RAM
+    backed, so long-running workers remove them when a session is closed.
+    
+    Args:
+        session_id: The session ID
+    """
+    for name in (f"{session_id}.jpg", f"{session_id}_search.jpg"):
+        try:
+            os.remove(os.path.join(SCREENSHOT_DIR, name))
+        except OSError:
+            pass
+
+
+def limit_html(html: str, limit: Optional[int] = None,
+               length: Optional[int] = None) -> Dict[str, Any]:
+    """Package page HTML for the JSON response, truncated to a size limit.
+    
+    Args:
+        html: The page HTML
+        limit: Maximum number of characters to return; None or 0 for no limit
+        length: Full length of the HTML if it was already cut in the browser
+        
+    Returns:
+        Dict: An "html" entry, plus "html_truncated" and "html_length" (the
+            full length) if the HTML was cut
+    """
+    length = len(html) if length is None else length
+    if not limit or length <= limit:
+        return {"html": html}
+        
+    return {"html": html[:limit], "html_truncated": True, "html_length": length}
+
+
+def write_result(result: Dict[str, Any], output_format: str = "json") -> None:
+    """Write a command result to stdout for the Elixir code to parse.
+    
+    Args:
+        result: The result to write
+        output_format: "json" for one line of compact JSON, or "zstd" for the
+            JSON compressed as a zstd frame, preceded by its length as a 4-byte
+            big-endian integer
+    """
+    payload = fast_json.dumps_bytes(result)
+    
+    if output_format == "zstd":
+        payload = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(payload)
+        payload = len(payload).to_bytes(4, "big") + payload
+    else:
+        payload += b"\n"
+        
+    # Anything printed earlier (e.g. debug output) must come out first
+    sys.stdout.flush()
+    sys.stdout.buffer.write(payload)
+    sys.stdout.buffer.flush()
 
 
 class WebAutomator:
@@ -50,6 +192,10 @@ class WebAutomator:
         # The current page
         self.page = None
         
+        # Storage states saved by this automator and hashes of what is on disk, by session ID
+        self._states: Dict[str, Dict[str, Any]] = {}
+        self._state_hashes: Dict[str, bytes] = {}
+        
     def __enter__(self):
         """Start the browser when entering the context."""
         self.start_browser()
@@ -60,35 +206,87 @@ class WebAutomator:
         self.close()
         
     def start_browser(self):
-        """Start the browser."""
-        self.playwright = sync_playwright().start()
+        """Start the browser.
+        
+        The browser context and page are created on first use, so a session
+        loaded right after starting doesn't throw away an empty context.
+        """
+        self.playwright = playwright_sync.sync_playwright().start()
         self.browser = self.playwright.chromium.launch(headless=self.headless)
-        self.context = self.browser.new_context()
-        self.page = self.context.new_page()
+        self.context = None
+        self.page = None
         
-        if self.debug:
-            self.page.on("console", lambda msg: print(f"BROWSER CONSOLE: {msg.text}"))
+    def _ensure_page(self, storage_state: Optional[Dict[str, Any]] = None):
+        """Create the browser context and page if they don't exist yet.
+        
+        Args:
+            storage_state: Optional storage state for a newly created context
             
+        Returns:
+            Page: The current page
+        """
+        if self.context is None:
+            self.context = self.browser.new_context(storage_state=storage_state)
+            self.page = self.context.new_page()
+            
+            if self.debug:
+                self.page.on("console", lambda msg: print(f"BROWSER CONSOLE: {msg.text}", file=sys.stderr))
+                
         return self.page
     
+    def get_html(self, limit: Optional[int] = None) -> Dict[str, Any]:
+        """Get the HTML of the current page.
+        
+        With a limit, the page is serialized and cut inside the browser, without
+        scripts and styles, so only the part that is returned is transferred.
+        
+        Args:
+            limit: Maximum number of characters to return; None or 0 for the
+                whole page as returned by page.content()
+                
+        Returns:
+            Dict: The limit_html entries for the page
+        """
+        self._ensure_page()
+        
+        if not limit:
+            return limit_html(self.page.content())
+            
+        html, length = self.page.evaluate(LIMITED_HTML_SCRIPT, limit)
+        return limit_html(html, limit, length)
+    
     def save_session(self) -> str:
         """Save the current session state.
         
+        The state file is only rewritten when the cookies or local storage
+        changed since the last save.
+        
         Returns:
             str: The session ID
         """
-        state_path = os.path.join(SESSION_DIR, f"{self.session_id}.json")
+        self._ensure_page()
+        storage_state = self.context.storage_state()
+        self._states[self.session_id] = storage_state
         
+        blob = fast_json.dumps_bytes(storage_state)
+        state_hash = hashlib.blake2b(blob, digest_size=16).digest()
+        if self._state_hashes.get(self.session_id) == state_hash:
+            return self.session_id
+            
         # Save browser state
-        storage_state = self.context.storage_state()
-        with open(state_path, "w") as f:
-            json.dump(storage_state, f)
+        state_path = os.path.join(SESSION_DIR, f"{self.session_id}.json")
+        with open(state_path, "wb") as f:
+            f.write(blob)
+        self._state_hashes[self.session_id] = state_hash
             
         return self.session_id
     
     def load_session(self, session_id: str) -> bool:
         """Load a previous session state.
         
+        Any open context is closed and a new one is created from the saved
+        state, so no cookies or local storage carry over from another session.
+        
         Args:
             session_id: The session ID to load
             
@@ -97,53 +295,71 @@ class WebAutomator:
         """
         state_path = os.path.join(SESSION_DIR, f"{session_id}.json")
         
-        if not os.path.exists(state_path):
+        # Sessions saved by this automator are reused from memory
+        storage_state = self._states.get(session_id)
+        if storage_state is None and not os.path.exists(state_path):
             return False
             
-        # Close existing context if it exists
+        if storage_state is None:
+            with open(state_path, "rb") as f:
+                blob = f.read()
+            storage_state = fast_json.loads(blob)
+            # So save_session can skip rewriting the file if nothing changes
+            self._state_hashes[session_id] = hashlib.blake2b(blob, digest_size=16).digest()
+                
+        self.session_id = session_id
+        
         if self.context:
             self.context.close()
+            self.context = None
+            self.page = None
             
-        # Create a new context with the saved state
-        with open(state_path, "r") as f:
-            storage_state = json.load(f)
-            
-        self.context = self.browser.new_context(storage_state=storage_state)
-        self.page = self.context.new_page()
-        self.session_id = session_id
-        
+        self._ensure_page(storage_state)
         return True
     
     def navigate(self, url: str, timeout: int = DEFAULT_TIMEOUT, 
-                 wait_until: str = DEFAULT_WAIT_UNTIL) -> Dict[str, Any]:
+                 wait_until: str = DEFAULT_WAIT_UNTIL, capture: bool = True,
+                 screenshot: str = "true",
+                 screenshot_output: str = "base64",
+                 html_limit: Optional[int] = None) -> Dict[str, Any]:
         """Navigate to a URL.
         
         Args:
             url: The URL to navigate to
             timeout: Maximum time to wait for navigation in milliseconds
             wait_until: When to consider navigation succeeded
+            capture: Whether to return the page HTML and a screenshot
+            screenshot: Screenshot mode (see screenshot_options)
+            screenshot_output: "base64" or "path" (see encode_screenshot)
+            html_limit: Maximum number of HTML characters to return (see limit_html)
             
         Returns:
             Dict: Result containing HTML content, title, etc.
         """
         try:
+            self._ensure_page()
             self.page.goto(url, timeout=timeout, wait_until=wait_until)
             
-            # Wait for page to be fully loaded
-            self.page.wait_for_load_state("networkidle", timeout=timeout)
-            
-            # Get page content and title
-            html = self.page.content()
             title = self.page.title()
             
-            # Take a screenshot
-            screenshot_path = os.path.join(SESSION_DIR, f"{self.session_id}.png")
-            self.page.screenshot(path=screenshot_path)
+            if not capture:
+                return {
+                    "success": True,
+                    "url": url,
+                    "title": title,
+                    "session_id": self.save_session(),
+                    "timestamp": datetime.now().isoformat()
+                }
+            
+            # Get page content
+            html_result = self.get_html(html_limit)
             
-            # Read the screenshot as base64 for JSON response
-            with open(screenshot_path, "rb") as f:
-                import base64
-                screenshot_base64 = base64.b64encode(f.read()).decode("utf-8")
+            # Take a screenshot
+            options = screenshot_options(screenshot)
+            screenshot_result = {}
+            if options is not None:
+                screenshot_result = encode_screenshot(self.page.screenshot(**options),
+                                                      f"{self.session_id}.jpg", screenshot_output)
                 
             # Save session state
             session_id = self.save_session()
@@ -152,15 +368,14 @@ class WebAutomator:
                 "success": True,
                 "url": url,
                 "title": title,
-                "html": html,
-                "screenshot": screenshot_base64,
+                **html_result,
+                **screenshot_result,
                 "session_id": session_id,
                 "timestamp": datetime.now().isoformat()
             }
             
         except Exception as e:
             if self.debug:
-                import traceback
                 traceback.print_exc()
                 
             return {
@@ -169,65 +384,64 @@ class WebAutomator:
                 "url": url
             }
     
-    def search(self, query: str, timeout: int = DEFAULT_TIMEOUT) -> Dict[str, Any]:
+    def search(self, query: str, timeout: int = DEFAULT_TIMEOUT,
+               wait_until: str = DEFAULT_WAIT_UNTIL,
+               screenshot: str = "true",
+               screenshot_output: str = "base64",
+               html_limit: Optional[int] = None,
+               human_typing: bool = False) -> Dict[str, Any]:
         """Perform a search on the current page.
         
         Args:
             query: The search query
             timeout: Maximum time to wait in milliseconds
+            wait_until: Load state to wait for after submitting the search
+            screenshot: Screenshot mode (see screenshot_options)
+            screenshot_output: "base64" or "path" (see encode_screenshot)
+            html_limit: Maximum number of HTML characters to return (see limit_html)
+            human_typing: Whether to click the input and type the query key by
+                key like a person would, instead of filling it in at once
             
         Returns:
             Dict: Result containing search results
         """
         try:
-            # Find search input element (using common selectors)
-            search_input_selectors = [
-                "input[type='search']",
-                "input[name='q']",
-                "input[name='query']",
-                "input[name='search']",
-                "input.search",
-                "#search-input",
-                ".search-input"
-            ]
-            
-            search_input = None
-            for selector in search_input_selectors:
-                try:
-                    search_input = self.page.query_selector(selector)
-                    if search_input:
-                        break
-                except:
-                    continue
-                    
-            if not search_input:
+            self._ensure_page()
+            
+            # Find search input element (common selectors or a searchbox, in one query)
+            search_input = self.page.locator(SEARCH_INPUT_SELECTOR).or_(
+                self.page.get_by_role("searchbox")
+            ).first
+            
+            if search_input.count() == 0:
                 return {
                     "success": False,
                     "error": "Could not find search input element",
                 }
                 
-            # Clear the search input and type the query
-            search_input.click()
-            search_input.fill("")
-            search_input.type(query, delay=100)  # Type slower to simulate human
+            # Enter the query; fill() replaces any existing text
+            if human_typing:
+                search_input.click()
+                search_input.fill("")
+                search_input.type(query, delay=HUMAN_TYPING_DELAY)
+            else:
+                search_input.fill(query)
             search_input.press("Enter")
             
             # Wait for results to load
-            self.page.wait_for_load_state("networkidle", timeout=timeout)
+            self.page.wait_for_load_state(wait_until, timeout=timeout)
             
             # Get page content and title
-            html = self.page.content()
+            html_result = self.get_html(html_limit)
             title = self.page.title()
             current_url = self.page.url
             
             # Take a screenshot
-            screenshot_path = os.path.join(SESSION_DIR, f"{self.session_id}_search.png")
-            self.page.screenshot(path=screenshot_path)
-            
-            # Read the screenshot as base64 for JSON response
-            with open(screenshot_path, "rb") as f:
-                import base64
-                screenshot_base64 = base64.b64encode(f.read()).decode("utf-8")
+            options = screenshot_options(screenshot)
+            screenshot_result = {}
+            if options is not None:
+                screenshot_result = encode_screenshot(self.page.screenshot(**options),
+                                                      f"{self.session_id}_search.jpg", screenshot_output)
                 
             # Save session state
             session_id = self.save_session()
@@ -236,16 +450,15 @@ class WebAutomator:
                 "success": True,
                 "url": current_url,
                 "title": title,
-                "html": html,
+                **html_result,
                 "query": query,
-                "screenshot": screenshot_base64,
+                **screenshot_result,
                 "session_id": session_id,
                 "timestamp": datetime.now().isoformat()
             }
             
         except Exception as e:
             if self.debug:
-                import traceback
                 traceback.print_exc()
                 
             return {
@@ -266,6 +479,412 @@ class WebAutomator:
             self.playwright.stop()
 
 
+class AsyncWebAutomator:
+    """Long-lived web automation using the Playwright async API.
+    
+    One browser is shared by every request. Each session ID gets its own browser
+    context and page, which stay open between requests so later actions in the
+    same session don't pay for context setup. Requests for different sessions
+    run concurrently; requests for the same session run one at a time.
+    
+    At most max_sessions contexts stay open. Beyond that the least recently used
+    idle sessions are closed, after writing their state to disk, and are reopened
+    from it by their next request.
+    """
+
+    def __init__(self, headless: bool = True, debug: bool = False,
+                 max_sessions: int = MAX_OPEN_SESSIONS):
+        """Initialize the web automator.
+        
+        Args:
+            headless: Whether to run the browser in headless mode
+            debug: Whether to enable debug mode
+            max_sessions: Number of session contexts to keep open
+        """
+        self.headless = headless
+        self.debug = debug
+        self.max_sessions = max(max_sessions, 1)
+        self.playwright = None
+        self.browser = None
+        
+        # Open contexts and pages, keyed by session ID, least recently used first
+        self.contexts: Dict[str, Any] = {}
+        self.pages: Dict[str, Any] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        
+        # Latest storage state of each session, written to disk on close
+        self._states: Dict[str, Dict[str, Any]] = {}
+        
+        # Create session directory if it doesn't exist
+        os.makedirs(SESSION_DIR, exist_ok=True)
+        
+    async def start_browser(self):
+        """Start the browser."""
+        from playwright.async_api import async_playwright
+        
+        self.playwright = await async_playwright().start()
+        self.browser = await self.playwright.chromium.launch(headless=self.headless)
+        
+    async def _get_page(self, session_id: Optional[str]) -> Any:
+        """Get the page for a session, creating its context if needed.
+        
+        Args:
+            session_id: The session ID
+            
+        Returns:
+            Page: The session's page
+        """
+        if session_id in self.pages:
+            # Mark the session as most recently used
+            self.contexts[session_id] = self.contexts.pop(session_id)
+            self.pages[session_id] = self.pages.pop(session_id)
+            return self.pages[session_id]
+            
+        storage_state = self._states.get(session_id)
+        state_path = os.path.join(SESSION_DIR, f"{session_id}.json")
+        if storage_state is None and os.path.exists(state_path):
+            with open(state_path, "rb") as f:
+                storage_state = fast_json.loads(f.read())
+                
+        context = await self.browser.new_context(storage_state=storage_state)
+        page = await context.new_page()
+        
+        if self.debug:
+            page.on("console", lambda msg: print(f"BROWSER CONSOLE: {msg.text}", file=sys.stderr))
+            
+        self.contexts[session_id] = context
+        self.pages[session_id] = page
+        await self._evict_sessions()
+        return page
+        
+    async def _evict_sessions(self) -> None:
+        """Close the least recently used idle sessions while too many are open.
+        
+        Their state is written to disk first, so they can be reopened later.
+        Sessions with a request in progress are skipped.
+        """
+        for session_id in list(self.contexts):
+            if len(self.contexts) <= self.max_sessions:
+                break
+                
+            lock = self._locks.get(session_id)
+            if lock is not None and lock.locked():
+                continue
+                
+            self._write_state(session_id)
+            self._states.pop(session_id, None)
+            self._locks.pop(session_id, None)
+            self.pages.pop(session_id)
+            await self.contexts.pop(session_id).close()
+            
+    async def _save_state(self, session_id: str) -> None:
+        """Remember the current storage state of a session.
+        
+        Args:
+            session_id: The session ID
+        """
+        self._states[session_id] = await self.contexts[session_id].storage_state()
+        
+    def _write_state(self, session_id: str) -> None:
+        """Write the remembered storage state of a session to disk.
+        
+        Args:
+            session_id: The session ID
+        """
+        if session_id in self._states:
+            state_path = os.path.join(SESSION_DIR, f"{session_id}.json")
+            with open(state_path, "wb") as f:
+                f.write(fast_json.dumps_bytes(self._states[session_id]))
+                
+    async def _capture(self, page: Any, name: str, screenshot: str = "true",
+                       screenshot_output: str = "base64",
+                       html_limit: Optional[int] = None) -> Dict[str, Any]:
+        """Capture the HTML, title and screenshot of a page.
+        
+        Args:
+            page: The page to capture
+            name: File name to use if the screenshot is written to a file
+            screenshot: Screenshot mode (see screenshot_options)
+            screenshot_output: "base64" or "path" (see encode_screenshot)
+            html_limit: Maximum number of HTML characters to return (see limit_html)
+            
+        Returns:
+            Dict: The page HTML, title, URL and screenshot
+        """
+        if html_limit:
+            html, length = await page.evaluate(LIMITED_HTML_SCRIPT, html_limit)
+            html_result = limit_html(html, html_limit, length)
+        else:
+            html_result = limit_html(await page.content())
+            
+        result = {
+            "url": page.url,
+            "title": await page.title(),
+            **html_result
+        }
+        
+        options = screenshot_options(screenshot)
+        if options is not None:
+            result.update(encode_screenshot(await page.screenshot(**options), name, screenshot_output))
+            
+        return result
+        
+    async def navigate(self, url: str, session_id: Optional[str] = None,
+                       timeout: int = DEFAULT_TIMEOUT,
+                       wait_until: str = DEFAULT_WAIT_UNTIL,
+                       screenshot: str = "true",
+                       screenshot_output: str = "base64",
+                       html_limit: Optional[int] = None) -> Dict[str, Any]:
+        """Navigate to a URL.
+        
+        Args:
+            url: The URL to navigate to
+            session_id: Session to use. A new session is started if not provided.
+            timeout: Maximum time to wait for navigation in milliseconds
+            wait_until: When to consider navigation succeeded
+            screenshot: Screenshot mode (see screenshot_options)
+            screenshot_output: "base64" or "path" (see encode_screenshot)
+            html_limit: Maximum number of HTML characters to return (see limit_html)
+            
+        Returns:
+            Dict: Result containing HTML content, title, etc.
+        """
+        session_id = session_id or str(uuid.uuid4())
+        lock = self._locks.setdefault(session_id, asyncio.Lock())
+        
+        async with lock:
+            try:
+                page = await self._get_page(session_id)
+                await page.goto(url, timeout=timeout, wait_until=wait_until)
+                
+                result = await self._capture(page, f"{session_id}.jpg", screenshot, screenshot_output,
+                                             html_limit)
+                await self._save_state(session_id)
+                
+                result.update({
+                    "success": True,
+                    "url": url,
+                    "session_id": session_id,
+                    "timestamp": datetime.now().isoformat()
+                })
+                return result
+                
+            except Exception as e:
+                if self.debug:
+                    traceback.print_exc()
+                    
+                return {
+                    "success": False,
+                    "error": str(e),
+                    "url": url
+                }
+                
+    async def search(self, query: str, session_id: str,
+                     timeout: int = DEFAULT_TIMEOUT,
+                     wait_until: str = DEFAULT_WAIT_UNTIL,
+                     screenshot: str = "true",
+                     screenshot_output: str = "base64",
+                     html_limit: Optional[int] = None,
+                     human_typing: bool = False) -> Dict[str, Any]:
+        """Perform a search on the current page of a session.
+        
+        Args:
+            query: The search query
+            session_id: Session whose current page to search on
+            timeout: Maximum time to wait in milliseconds
+            wait_until: Load state to wait for after submitting the search
+            screenshot: Screenshot mode (see screenshot_options)
+            screenshot_output: "base64" or "path" (see encode_screenshot)
+            html_limit: Maximum number of HTML characters to return (see limit_html)
+            human_typing: Whether to click the input and type the query key by
+                key like a person would, instead of filling it in at once
+            
+        Returns:
+            Dict: Result containing search results
+        """
+        lock = self._locks.setdefault(session_id, asyncio.Lock())
+        
+        async with lock:
+            try:
+                page = await self._get_page(session_id)
+                
+                # Find search input element (common selectors or a searchbox, in one query)
+                search_input = page.locator(SEARCH_INPUT_SELECTOR).or_(
+                    page.get_by_role("searchbox")
+                ).first
+                
+                if await search_input.count() == 0:
+                    return {
+                        "success": False,
+                        "error": "Could not find search input element",
+                    }
+                    
+                # Enter the query; fill() replaces any existing text
+                if human_typing:
+                    await search_input.click()
+                    await search_input.fill("")
+                    await search_input.type(query, delay=HUMAN_TYPING_DELAY)
+                else:
+                    await search_input.fill(query)
+                await search_input.press("Enter")
+                
+                # Wait for results to load
+                await page.wait_for_load_state(wait_until, timeout=timeout)
+                
+                result = await self._capture(page, f"{session_id}_search.jpg", screenshot,
+                                             screenshot_output, html_limit)
+                await self._save_state(session_id)
+                
+                result.update({
+                    "success": True,
+                    "query": query,
+                    "session_id": session_id,
+                    "timestamp": datetime.now().isoformat()
+                })
+                return result
+                
+            except Exception as e:
+                if self.debug:
+                    traceback.print_exc()
+                    
+                return {
+                    "success": False,
+                    "error": str(e),
+                    "query": query
+                }
+                
+    async def close_session(self, session_id: str) -> Dict[str, Any]:
+        """Close a session's context and write its state to disk.
+        
+        Screenshot files written for the session are deleted.
+        
+        Args:
+            session_id: The session ID
+            
+        Returns:
+            Dict: Result of the close
+        """
+        lock = self._locks.setdefault(session_id, asyncio.Lock())
+        
+        async with lock:
+            self._write_state(session_id)
+            self._states.pop(session_id, None)
+            self.pages.pop(session_id, None)
+            context = self.contexts.pop(session_id, None)
+            if context:
+                await context.close()
+            remove_screenshots(session_id)
+                
+        self._locks.pop(session_id, None)
+        return {"success": True, "session_id": session_id}
+        
+    async def close(self):
+        """Close every session, the browser, and clean up resources."""
+        for session_id in list(self.contexts):
+            await self.close_session(session_id)
+            
+        if self.browser:
+            await self.browser.close()
+            
+        if self.playwright:
+            await self.playwright.stop()
+
+
+async def serve(headless: bool = True, debug: bool = False):
+    """Serve automation requests read from stdin, one JSON object per line.
+    
+    Each request has an "action" (navigate, search, close_session, ping or
+    shutdown), the action's arguments, and an optional "id" that is copied into
+    the reply. Replies are written to stdout, one JSON object per line, in the
+    order the requests complete. Requests are handled concurrently.
+    
+    Args:
+        headless: Whether to run the browser in headless mode
+        debug: Whether to enable debug mode
+    """
+    automator = AsyncWebAutomator(headless=headless, debug=debug)
+    await automator.start_browser()
+    
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader()
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+    
+    async def handle(request: Dict[str, Any]) -> Dict[str, Any]:
+        action = request.get("action")
+        
+        if action == "navigate" and request.get("url"):
+            return await automator.navigate(
+                request["url"],
+                session_id=request.get("session_id"),
+                timeout=request.get("timeout", DEFAULT_TIMEOUT),
+                wait_until=request.get("wait_until", DEFAULT_WAIT_UNTIL),
+                screenshot=request.get("screenshot", "true"),
+                screenshot_output=request.get("screenshot_output", "base64"),
+                html_limit=request.get("html_limit", DEFAULT_HTML_LIMIT)
+            )
+            
+        if action == "search" and request.get("query") and request.get("session_id"):
+            return await automator.search(
+                request["query"],
+                request["session_id"],
+                timeout=request.get("timeout", DEFAULT_TIMEOUT),
+                wait_until=request.get("wait_until", DEFAULT_WAIT_UNTIL),
+                screenshot=request.get("screenshot", "true"),
+                screenshot_output=request.get("screenshot_output", "base64"),
+                html_limit=request.get("html_limit", DEFAULT_HTML_LIMIT),
+                human_typing=request.get("human_typing", False)
+            )
+            
+        if action == "close_session" and request.get("session_id"):
+            return await automator.close_session(request["session_id"])
+            
+        if action == "ping":
+            return {"success": True}
+            
+        return {
+            "success": False,
+            "error": f"Invalid action or missing required arguments. Action: {action}"
+        }
+        
+    async def respond(request: Dict[str, Any]) -> None:
+        try:
+            result = await handle(request)
+        except Exception as e:
+            result = {"success": False, "error": str(e)}
+        if "id" in request:
+            result["id"] = request["id"]
+        sys.stdout.write(fast_json.dumps(result) + "\n")
+        sys.stdout.flush()
+        
+    pending = set()
+    
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+                
+            try:
+                request = fast_json.loads(line)
+            except ValueError as e:
+                sys.stdout.write(fast_json.dumps({"success": False, "error": f"Invalid JSON: {e}"}) + "\n")
+                sys.stdout.flush()
+                continue
+                
+            if request.get("action") == "shutdown":
+                break
+                
+            task = asyncio.ensure_future(respond(request))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+            
+        # Let in-flight requests finish before closing the browser
+        await asyncio.gather(*pending)
+        
+    finally:
+        await automator.close()
+
+
 def parse_args():
     """Parse command line arguments."""
     parser = argparse.ArgumentParser(description="Web automation script using Playwright")
@@ -293,11 +912,24 @@ def parse_args():
                         choices=["true", "false"],
                         help="Whether to run the browser in headless mode")
     parser.add_argument("--screenshot", type=str, default="true",
-                        choices=["true", "false"],
-                        help="Whether to take a screenshot")
+                        choices=["true", "false", "full"],
+                        help="Screenshot to take: the viewport (true), none (false), "
+                             "or the whole page (full)")
+    parser.add_argument("--screenshot-output", type=str, default="base64",
+                        choices=["base64", "path"],
+                        help="Return screenshots as base64 in the JSON, or as a file path")
+    parser.add_argument("--html-limit", type=int, default=DEFAULT_HTML_LIMIT,
+                        help="Maximum number of HTML characters to return (0 for no limit)")
+    parser.add_argument("--output-format", type=str, default="json",
+                        choices=["json", "zstd"],
+                        help="Write the result as a line of JSON, or as length-prefixed zstd-compressed JSON")
+    parser.add_argument("--human-typing", action="store_true",
+                        help="Type search queries key by key with a delay, like a person")
     parser.add_argument("--debug", type=str, default="false",
                         choices=["true", "false"],
                         help="Whether to enable debug mode")
+    parser.add_argument("--serve", action="store_true",
+                        help="Keep one browser running and serve JSON requests from stdin")
                         
     return parser.parse_args()
 
@@ -310,6 +942,14 @@ def main():
     headless = args.headless.lower() == "true"
     debug = args.debug.lower() == "true"
     
+    if args.serve:
+        asyncio.run(serve(headless=headless, debug=debug))
+        return
+        
+    if args.output_format == "zstd" and zstandard is None:
+        write_result({"success": False, "error": "zstandard is not installed. Please run: pip install zstandard"})
+        sys.exit(1)
+    
     try:
         with WebAutomator(headless=headless, debug=debug) as automator:
             # If a session ID is provided, load it
@@ -319,7 +959,7 @@ def main():
                         "success": False,
                         "error": f"Could not load session {args.session}"
                     }
-                    print(json.dumps(result))
+                    write_result(result, args.output_format)
                     return
             
             # Perform the requested action
@@ -327,13 +967,21 @@ def main():
                 result = automator.navigate(
                     args.url,
                     timeout=args.timeout,
-                    wait_until=args.wait_until
+                    wait_until=args.wait_until,
+                    screenshot=args.screenshot,
+                    screenshot_output=args.screenshot_output,
+                    html_limit=args.html_limit
                 )
                 
             elif args.action == "search" and args.query:
                 result = automator.search(
                     args.query,
-                    timeout=args.timeout
+                    timeout=args.timeout,
+                    wait_until=args.wait_until,
+                    screenshot=args.screenshot,
+                    screenshot_output=args.screenshot_output,
+                    html_limit=args.html_limit,
+                    human_typing=args.human_typing
                 )
                 
             else:
@@ -343,16 +991,15 @@ def main():
                 }
                 
             # Print the result as JSON to stdout for the Elixir code to parse
-            print(json.dumps(result))
+            write_result(result, args.output_format)
             
     except Exception as e:
-        import traceback
         result = {
             "success": False,
             "error": str(e),
             "traceback": traceback.format_exc() if debug else None
         }
-        print(json.dumps(result))
+        write_result(result, args.output_format)
 
 
 if __name__ == "__main__":
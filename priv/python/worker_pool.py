@@ -0,0 +1,472 @@
+#!/usr/bin/env python3
+"""
+Pool of warm browser worker processes.
+This script keeps one browser running in each of several processes and spreads automation requests across them.
+"""
+
+import argparse
+import itertools
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+import uuid
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional, Tuple
+
+# Add the current directory to the Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fast_json
+from web_automation import (
+    DEFAULT_HTML_LIMIT, DEFAULT_TIMEOUT, DEFAULT_WAIT_UNTIL, MAX_OPEN_SESSIONS,
+    WebAutomator, encode_screenshot, remove_screenshots, screenshot_options
+)
+
+# One browser per core
+DEFAULT_POOL_SIZE = os.cpu_count() or 1
+# Seconds to wait for a worker to close its browser on shutdown
+WORKER_STOP_TIMEOUT = 10.0
+# Seconds between checks for worker processes that exited
+WORKER_CHECK_INTERVAL = 1.0
+
+
+def _share_screenshot(data: bytes) -> Dict[str, Any]:
+    """Copy screenshot bytes into a new shared memory block for the parent process.
+
+    Args:
+        data: The image bytes
+
+    Returns:
+        Dict: The name and size of the block, to be read with _take_screenshot
+    """
+    block = shared_memory.SharedMemory(create=True, size=len(data))
+    block.buf[:len(data)] = data
+    block.close()
+    return {"_screenshot_shm": block.name, "_screenshot_size": len(data)}
+
+
+def _take_screenshot(result: Dict[str, Any]) -> Optional[bytes]:
+    """Read and free the shared memory block named in a worker result.
+
+    Args:
+        result: A worker result; its shared memory entries are removed
+
+    Returns:
+        Optional[bytes]: The image bytes, or None if the result has no screenshot
+    """
+    name = result.pop("_screenshot_shm", None)
+    size = result.pop("_screenshot_size", 0)
+    if name is None:
+        return None
+
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        return bytes(block.buf[:size])
+    finally:
+        block.close()
+        block.unlink()
+
+
+def _use_session(automator: WebAutomator, sessions: Dict[str, Tuple[Any, Any]],
+                 session_id: Optional[str]) -> bool:
+    """Point a worker's automator at the context and page of a session.
+
+    Each session has its own browser context, so cookies and local storage
+    never leak between sessions that share a worker. At most MAX_OPEN_SESSIONS
+    contexts stay open; the least recently used ones beyond that are closed and
+    reopened from their saved state by their next request.
+
+    Args:
+        automator: The worker's started WebAutomator
+        sessions: The worker's (context, page) pairs, by session ID, least
+            recently used first
+        session_id: The session to use, or None to start a new one
+
+    Returns:
+        bool: Whether the session could be used
+    """
+    if session_id in sessions:
+        # Mark the session as most recently used
+        sessions[session_id] = sessions.pop(session_id)
+        automator.context, automator.page = sessions[session_id]
+        automator.session_id = session_id
+        return True
+
+    # A new context is created for the session on first use
+    automator.context = None
+    automator.page = None
+    if session_id is None:
+        automator.session_id = str(uuid.uuid4())
+        automator._ensure_page()
+    elif not automator.load_session(session_id):
+        return False
+
+    sessions[automator.session_id] = (automator.context, automator.page)
+    while len(sessions) > MAX_OPEN_SESSIONS:
+        _close_session(automator, sessions, next(iter(sessions)))
+    return True
+
+
+def _close_session(automator: WebAutomator, sessions: Dict[str, Tuple[Any, Any]],
+                   session_id: str) -> Dict[str, Any]:
+    """Close the browser context of a session held by a worker.
+
+    Its state was already written by the last navigate or search, so it can
+    be loaded again later.
+
+    Args:
+        automator: The worker's started WebAutomator
+        sessions: The worker's (context, page) pairs, by session ID
+        session_id: The session ID
+
+    Returns:
+        Dict: Result indicating success
+    """
+    entry = sessions.pop(session_id, None)
+    automator._states.pop(session_id, None)
+    automator._state_hashes.pop(session_id, None)
+    if entry is not None:
+        context, _ = entry
+        if automator.context is context:
+            automator.context = None
+            automator.page = None
+        context.close()
+
+    return {"success": True, "session_id": session_id}
+
+
+def _handle(automator: WebAutomator, sessions: Dict[str, Tuple[Any, Any]],
+            request: Dict[str, Any]) -> Dict[str, Any]:
+    """Run one request on a worker's automator.
+
+    Requests with a session_id continue that session; a navigate request
+    without one starts a new session in a new browser context.
+
+    Args:
+        automator: The worker's started WebAutomator
+        sessions: The worker's (context, page) pairs, by session ID
+        request: The request
+
+    Returns:
+        Dict: The result, with any screenshot left in shared memory
+    """
+    action = request.get("action")
+    session_id = request.get("session_id")
+
+    if action == "ping":
+        return {"success": True, "pid": os.getpid()}
+
+    if action == "close_session" and session_id:
+        return _close_session(automator, sessions, session_id)
+
+    # Checked before the session is opened, so invalid requests don't leave contexts behind
+    if not ((action == "navigate" and request.get("url"))
+            or (action == "search" and request.get("query") and session_id)):
+        return {
+            "success": False,
+            "error": f"Invalid action or missing required arguments. Action: {action}"
+        }
+
+    if not _use_session(automator, sessions, session_id):
+        return {"success": False, "error": f"Could not load session {session_id}"}
+
+    # The screenshot is taken separately so its bytes can go through shared memory
+    options = {
+        "timeout": request.get("timeout", DEFAULT_TIMEOUT),
+        "wait_until": request.get("wait_until", DEFAULT_WAIT_UNTIL),
+        "screenshot": "false",
+        "html_limit": request.get("html_limit", DEFAULT_HTML_LIMIT)
+    }
+
+    if action == "navigate":
+        result = automator.navigate(request["url"], **options)
+    else:
+        result = automator.search(request["query"], human_typing=request.get("human_typing", False),
+                                  **options)
+
+    if not result.get("success", False):
+        if session_id is None:
+            # The client never learns the new session's ID, so it could never close it
+            _close_session(automator, sessions, automator.session_id)
+        return result
+
+    screenshot = screenshot_options(request.get("screenshot", "true"))
+    if screenshot is not None:
+        result.update(_share_screenshot(automator.page.screenshot(**screenshot)))
+
+    return result
+
+
+def _worker_main(tasks: Any, results: Any, headless: bool, debug: bool) -> None:
+    """Run requests from a task queue on one browser until a None task arrives.
+
+    Args:
+        tasks: Queue of (task_id, request) pairs for this worker
+        results: Queue shared by all workers for (task_id, result) pairs
+        headless: Whether to run the browser in headless mode
+        debug: Whether to enable debug mode
+    """
+    automator = WebAutomator(headless=headless, debug=debug)
+    # Browser context and page of each session held by this worker
+    sessions: Dict[str, Tuple[Any, Any]] = {}
+    try:
+        automator.start_browser()
+        start_error = None
+    except Exception as e:
+        start_error = f"Could not start browser: {e}"
+
+    try:
+        while True:
+            task_id, request = tasks.get()
+            if request is None:
+                break
+
+            if start_error is not None:
+                result = {"success": False, "error": start_error}
+            else:
+                try:
+                    result = _handle(automator, sessions, request)
+                except Exception as e:
+                    result = {"success": False, "error": str(e)}
+
+            results.put((task_id, result))
+    finally:
+        if start_error is None:
+            automator.close()
+
+
+class WorkerPool:
+    """Pool of processes that each keep a started WebAutomator."""
+
+    def __init__(self, size: int = DEFAULT_POOL_SIZE, headless: bool = True, debug: bool = False):
+        """Start the worker processes.
+
+        Args:
+            size: Number of worker processes (and browsers)
+            headless: Whether to run the browsers in headless mode
+            debug: Whether to enable debug mode
+        """
+        # Playwright isn't safe to fork, so workers are started from scratch
+        context = multiprocessing.get_context("spawn")
+
+        self._results = context.Queue()
+        self._tasks = [context.Queue() for _ in range(size)]
+        self._processes = [
+            context.Process(target=_worker_main, args=(tasks, self._results, headless, debug),
+                            daemon=True)
+            for tasks in self._tasks
+        ]
+        for process in self._processes:
+            process.start()
+
+        # Pending futures with their request and worker, by task ID
+        self._pending: Dict[int, Tuple[Future, Dict[str, Any], int]] = {}
+        # Worker that holds each session, so a session's requests stay on one browser
+        self._session_workers: Dict[str, int] = {}
+        self._task_ids = itertools.count()
+        self._next_worker = itertools.cycle(range(size))
+        self._lock = threading.Lock()
+
+        self._collector = threading.Thread(target=self._collect, daemon=True)
+        self._collector.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def submit(self, request: Dict[str, Any]) -> Future:
+        """Send a request to a worker.
+
+        Requests for a session go to the worker that holds it; other requests
+        are spread round-robin.
+
+        Args:
+            request: A navigate, search, close_session or ping request, with the same
+                arguments as the web_automation.py worker accepts
+
+        Returns:
+            Future: Resolves to the result dictionary
+        """
+        future = Future()
+
+        with self._lock:
+            task_id = next(self._task_ids)
+            worker = self._session_workers.get(request.get("session_id"))
+            if worker is None:
+                # Skip workers that exited, unless none are left
+                for _ in self._processes:
+                    worker = next(self._next_worker)
+                    if self._processes[worker].is_alive():
+                        break
+            self._pending[task_id] = (future, request, worker)
+
+        self._tasks[worker].put((task_id, request))
+        return future
+
+    def close_session(self, session_id: str) -> Future:
+        """Close a session on the worker that holds it and delete its screenshot files.
+
+        Args:
+            session_id: The session ID
+
+        Returns:
+            Future: Resolves to a result indicating success
+        """
+        return self.submit({"action": "close_session", "session_id": session_id})
+
+    def _fail_dead_workers(self) -> None:
+        """Fail the pending requests and forget the sessions of workers that exited."""
+        dead = {worker for worker, process in enumerate(self._processes) if not process.is_alive()}
+        if not dead:
+            return
+
+        with self._lock:
+            failed = [task_id for task_id, (_, _, worker) in self._pending.items() if worker in dead]
+            futures = [self._pending.pop(task_id)[0] for task_id in failed]
+            for session_id, worker in list(self._session_workers.items()):
+                if worker in dead:
+                    del self._session_workers[session_id]
+
+        for future in futures:
+            future.set_result({"success": False, "error": "Worker process exited"})
+
+    def _collect(self) -> None:
+        """Resolve futures from the shared result queue until close."""
+        while True:
+            try:
+                item = self._results.get(timeout=WORKER_CHECK_INTERVAL)
+            except queue.Empty:
+                self._fail_dead_workers()
+                continue
+
+            if item is None:
+                break
+
+            task_id, result = item
+            with self._lock:
+                entry = self._pending.pop(task_id, None)
+                if entry is not None:
+                    future, request, worker = entry
+                    closed = request.get("session_id") if request.get("action") == "close_session" else None
+                    if closed:
+                        self._session_workers.pop(closed, None)
+                    elif result.get("session_id"):
+                        self._session_workers[result["session_id"]] = worker
+
+            if entry is None:
+                # The request was already failed; just free its screenshot
+                _take_screenshot(result)
+                continue
+
+            if closed:
+                remove_screenshots(closed)
+
+            try:
+                data = _take_screenshot(result)
+                if data is not None:
+                    name = f"{result.get('session_id', task_id)}.jpg"
+                    result.update(encode_screenshot(data, name,
+                                                    request.get("screenshot_output", "base64")))
+            except Exception as e:
+                result = {"success": False, "error": f"Could not read screenshot: {e}"}
+
+            future.set_result(result)
+
+            self._fail_dead_workers()
+
+    def close(self) -> None:
+        """Stop the workers and close their browsers."""
+        for tasks in self._tasks:
+            tasks.put((None, None))
+
+        for process in self._processes:
+            process.join(WORKER_STOP_TIMEOUT)
+            if process.is_alive():
+                process.terminate()
+
+        self._results.put(None)
+        self._collector.join()
+
+        with self._lock:
+            pending: List[Future] = [future for future, _, _ in self._pending.values()]
+            self._pending.clear()
+
+        for future in pending:
+            future.set_result({"success": False, "error": "Worker pool closed"})
+
+
+def serve(size: int = DEFAULT_POOL_SIZE, headless: bool = True, debug: bool = False):
+    """Serve automation requests read from stdin with a pool of browsers.
+
+    Uses the same line protocol as web_automation.py --serve: each request has
+    an "action" (navigate, search, close_session, ping or shutdown) and an
+    optional "id" that is copied into the reply. Replies are written to stdout,
+    one JSON object per line, in the order the requests complete.
+
+    Args:
+        size: Number of worker processes (and browsers)
+        headless: Whether to run the browsers in headless mode
+        debug: Whether to enable debug mode
+    """
+    output_lock = threading.Lock()
+
+    def reply(request: Dict[str, Any], result: Dict[str, Any]) -> None:
+        if "id" in request:
+            result["id"] = request["id"]
+        with output_lock:
+            sys.stdout.write(fast_json.dumps(result) + "\n")
+            sys.stdout.flush()
+
+    with WorkerPool(size=size, headless=headless, debug=debug) as pool:
+        for line in sys.stdin:
+            if not line.strip():
+                continue
+
+            try:
+                request = fast_json.loads(line)
+            except ValueError as e:
+                reply({}, {"success": False, "error": f"Invalid JSON: {e}"})
+                continue
+
+            action = request.get("action")
+            if action == "shutdown":
+                break
+
+            future = pool.submit(request)
+            future.add_done_callback(lambda done, request=request: reply(request, done.result()))
+
+
+def parse_args():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Serve web automation requests with a pool of browsers")
+
+    parser.add_argument("--workers", type=int, default=DEFAULT_POOL_SIZE,
+                        help="Number of browser worker processes")
+    parser.add_argument("--headless", type=str, default="true",
+                        choices=["true", "false"],
+                        help="Whether to run the browsers in headless mode")
+    parser.add_argument("--debug", type=str, default="false",
+                        choices=["true", "false"],
+                        help="Whether to enable debug mode")
+
+    return parser.parse_args()
+
+
+def main():
+    """Main entry point."""
+    args = parse_args()
+
+    serve(
+        size=max(args.workers, 1),
+        headless=args.headless.lower() == "true",
+        debug=args.debug.lower() == "true"
+    )
+
+
+if __name__ == "__main__":
+    main()